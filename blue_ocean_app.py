@@ -1,10 +1,88 @@
 # Blue Ocean Strategy Canvas – Ascendea UI (stable editor, Chrome-friendly)
 
+import hashlib
+import io
+import os
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import numpy as np
 
+from blue_ocean_engine import (
+    DISTANCE_METRICS,
+    ERRC_ACTIONS,
+    average_linkage,
+    build_portfolio,
+    canvas_gaps,
+    CanvasStore,
+    canvas_map,
+    cut_groups,
+    errc_table,
+    factor_summary,
+    headroom_ranking,
+    load_canvases,
+    nearest_rivals,
+    portfolio_errc,
+    series_distances,
+)
+from scenario_store import ScenarioStore
+
+MAP_LABEL_MAX = 30  # above this many series the map shows names on hover only
+# Server folders are only offered when an operator sets this root; reads never leave it
+PORTFOLIO_ROOT = os.environ.get("BLUE_OCEAN_PORTFOLIO_ROOT") or None
+
+
+@st.cache_data(max_entries=16, show_spinner="Comparing series…")
+def similarity(canvas_key: str, _scores: np.ndarray, metric: str) -> dict:
+    """Distances, merge tree and 2D map for one canvas; keyed on the canvas hash, not the array."""
+    dist = series_distances(_scores, metric)
+    return {"dist": dist, "merges": average_linkage(dist), "xy": canvas_map(dist)}
+
+
+# Branded colour mapping: Our Offer = teal, Competitor 1 = red, Competitor 2 = orange
+BASE_COLORS = {
+    "Our Offer": "#00E4AB",
+    "Competitor 1": "#F2003C",
+    "Competitor 2": "#fd7232",
+}
+PALETTE_FALLBACK = ["#7b61ff", "#f5b700", "#10b981", "#6366f1", "#ec4899"]
+
+
+@st.cache_data(max_entries=32)
+def series_colors(series: tuple) -> dict:
+    """Plotly colour map for a series list; other series take the fallback palette, then grey."""
+    spare = iter(PALETTE_FALLBACK)
+    return {s: BASE_COLORS[s] if s in BASE_COLORS else next(spare, "#999999") for s in series}
+
+
+@st.cache_resource(max_entries=8)
+def load_canvas(file_bytes: bytes) -> CanvasStore | None:
+    """Read-only store for an uploaded canvas, parsed once per file; None without a value_factor column."""
+    df = pd.read_csv(io.BytesIO(file_bytes))
+    return CanvasStore.from_frame(df) if "value_factor" in df.columns else None
+
+
+@st.cache_resource
+def canvas_cache():
+    # Parsed canvases by file hash; set BLUE_OCEAN_CACHE_DIR to keep them on disk across restarts
+    return ScenarioStore(max_entries=4096, disk_dir=os.environ.get("BLUE_OCEAN_CACHE_DIR") or None)
+
+
+def reset_canvas(df: pd.DataFrame):
+    """Start a new store and editor session on `df` (reset to sample)."""
+    st.session_state.bo_store = CanvasStore.from_frame(df)
+    st.session_state.bo_base = st.session_state.bo_store.frame()
+    st.session_state.bo_rev = st.session_state.get("bo_rev", 0) + 1
+
+
+def restart_editor():
+    """New editor session on the store as it stands (after add/rename; pending edits are already folded in)."""
+    store = st.session_state.bo_store
+    store.rebase()
+    st.session_state.bo_base = store.frame()
+    st.session_state.bo_rev += 1
+
 # ---------- Page config ----------
 st.set_page_config(page_title="Ascendea – Blue Ocean Strategy Canvas", layout="wide")
 
@@ -33,7 +111,7 @@ with st.sidebar:
     st.markdown("---")
     st.header("Data source")
 
-    mode = st.radio("Choose data mode", ["Manual editor", "Upload CSV"], index=0)
+    mode = st.radio("Choose data mode", ["Manual editor", "Upload CSV", "Portfolio (many CSVs)"], index=0)
     st.caption("CSV must be wide format with columns: value_factor, Our Offer, Competitor 1, Competitor 2, ...")
 
 # ---------- Global CSS ----------
@@ -365,95 +443,204 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+# ---------- Portfolio mode ----------
+if mode == "Portfolio (many CSVs)":
+    with st.sidebar:
+        portfolio_files = st.file_uploader(
+            "Upload canvas CSVs (one per client / segment)", type=["csv"], accept_multiple_files=True
+        )
+        portfolio_dir = (
+            st.text_input(f"…or a folder of canvas CSVs under {PORTFOLIO_ROOT}") if PORTFOLIO_ROOT else ""
+        )
+
+    sources = [(f.name, f.getvalue()) for f in portfolio_files or []]
+    if portfolio_dir:
+        root = os.path.realpath(PORTFOLIO_ROOT)
+        folder = os.path.realpath(os.path.join(root, portfolio_dir))
+        if os.path.commonpath([root, folder]) != root:
+            st.error("Folder must be inside the portfolio root.")
+            st.stop()
+        if not os.path.isdir(folder):
+            st.error(f"Folder not found: {portfolio_dir}")
+            st.stop()
+        for dirpath, dirnames, names in os.walk(folder):
+            dirnames.sort()
+            for n in sorted(names):
+                path = os.path.realpath(os.path.join(dirpath, n))
+                # Symlinks may point outside the root; skip those
+                if n.lower().endswith(".csv") and os.path.commonpath([root, path]) == root:
+                    sources.append((os.path.relpath(os.path.join(dirpath, n), folder), path))
+    if not sources:
+        st.info(
+            "Upload one strategy canvas CSV per client or segment"
+            + (", or point to a folder of them." if PORTFOLIO_ROOT else ".")
+        )
+        st.stop()
+
+    loaded, errors = load_canvases(sources, canvas_cache())
+    if errors:
+        st.warning(f"{len(errors)} file(s) skipped.")
+        with st.expander("Skipped files"):
+            st.dataframe(pd.DataFrame(errors, columns=["file", "error"]), use_container_width=True, hide_index=True)
+    if not loaded:
+        st.error("None of the files could be read as a strategy canvas.")
+        st.stop()
+
+    portfolio_key = hashlib.sha1("\n".join(f"{n}\0{d}" for n, d, _ in loaded).encode()).hexdigest()
+    portfolio = canvas_cache().get_or_compute("portfolio-" + portfolio_key, lambda: build_portfolio(loaded))
+    with st.sidebar:
+        cache_stats = canvas_cache().stats()
+        st.caption(f"Canvas cache: {cache_stats['entries']} entries · {cache_stats['hits']} hits / "
+                   f"{cache_stats['misses']} parsed")
+
+    st.subheader("Portfolio — Differentiation Headroom")
+    p1, p2 = st.columns(2)
+    p_reference = p1.radio(
+        "Compare against",
+        ["mean", "best"],
+        horizontal=True,
+        format_func={"mean": "Competitor average", "best": "Best competitor"}.get,
+    )
+    p_raise, p_reduce = p2.slider("Raise at or below / Reduce at or above", -5.0, 5.0, (-1.0, 1.0), 0.25)
+
+    portfolio_df = portfolio_errc(portfolio, p_reference, p_raise, p_reduce)
+    ranking = headroom_ranking(portfolio_df, portfolio)
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Canvases", f"{len(portfolio['canvases']):,}")
+    m2.metric("Factors in dictionary", f"{len(portfolio['factor_labels']):,}")
+    m3.metric("Canvas × factor rows", f"{len(portfolio_df):,}")
+
+    st.caption(
+        "Headroom = total |gap| on factors the ERRC grid flags to Raise or Reduce, per factor on the canvas. "
+        "Divergence = mean |gap| over all factors."
+    )
+    st.dataframe(ranking, use_container_width=True, hide_index=True)
+
+    top = ranking.head(25).iloc[::-1]
+    rank_fig = px.bar(top, x="headroom", y="canvas", orientation="h", title="Top clients by differentiation headroom")
+    rank_fig.update_traces(marker_color="#00E4AB")
+    rank_color = "#ffffff" if theme_choice == "Dark" else "#393939"
+    rank_fig.update_layout(
+        yaxis_title="",
+        title_font=dict(family="Inter", size=16, color=rank_color),
+        font=dict(family="Inter", color=rank_color),
+        height=max(300, 24 * len(top) + 120),
+    )
+    st.plotly_chart(rank_fig, use_container_width=True)
+
+    st.markdown("**Factors across the portfolio**")
+    st.dataframe(factor_summary(portfolio_df, portfolio), use_container_width=True, hide_index=True)
+
+    pick = st.selectbox("Client ERRC grid", ranking["canvas"])
+    st.dataframe(
+        portfolio_df.loc[portfolio_df["canvas"] == pick].drop(columns=["canvas", "factor_id", "gap"]),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    d1, d2 = st.columns(2)
+    d1.download_button(
+        "⬇️ Download headroom ranking (CSV)",
+        data=ranking.to_csv(index=False),
+        file_name="portfolio_headroom.csv",
+        mime="text/csv",
+    )
+    d2.download_button(
+        "⬇️ Download portfolio ERRC (CSV)",
+        data=portfolio_df.drop(columns=["factor_id", "gap"]).to_csv(index=False),
+        file_name="portfolio_errc.csv",
+        mime="text/csv",
+    )
+    st.stop()
+
 # ---------- Data mode handling ----------
 if mode == "Upload CSV":
     with st.sidebar:
         uploaded = st.file_uploader("Upload strategy_canvas_data.csv", type=["csv"])
     if uploaded is not None:
-        df_raw = pd.read_csv(uploaded)
+        store = load_canvas(uploaded.getvalue())
+        if store is None:
+            st.error("Your data needs a 'value_factor' column.")
+            st.stop()
     else:
         st.info("No file uploaded — using sample data.")
-        df_raw = sample_df.copy()
+        store = load_canvas(sample_df.to_csv(index=False).encode())
 else:
-    if "bo_df" not in st.session_state:
-        st.session_state.bo_df = sample_df.copy()
+    if "bo_store" not in st.session_state:
+        reset_canvas(sample_df)
     if "our_label" not in st.session_state:
         st.session_state.our_label = "Our Offer"
+    store = st.session_state.bo_store
+    editor_key = f"bo_editor_{st.session_state.bo_rev}"
+    # Fold the editor's pending edits in before anything reads the canvas
+    store.apply_editor(st.session_state.get(editor_key) or {})
 
     with st.sidebar:
         st.subheader("Our label & competitors")
         our_label = st.text_input("Rename 'Our Offer' label", value=st.session_state.our_label)
-        if our_label != st.session_state.our_label and st.session_state.our_label in st.session_state.bo_df.columns:
-            st.session_state.bo_df = st.session_state.bo_df.rename(columns={st.session_state.our_label: our_label})
+        if (our_label != st.session_state.our_label and st.session_state.our_label in store.series
+                and our_label not in store.series):
+            store.rename_series(st.session_state.our_label, our_label)
+            restart_editor()
             st.session_state.our_label = our_label
 
         new_comp = st.text_input("Add competitor (press Enter)")
-        if new_comp and new_comp not in st.session_state.bo_df.columns and new_comp != st.session_state.our_label:
-            st.session_state.bo_df[new_comp] = 5
+        if new_comp and new_comp not in store.series and new_comp != st.session_state.our_label:
+            store.add_series(new_comp, 5)
+            restart_editor()
             st.success(f"Added column: {new_comp}")
 
         c1, c2 = st.columns(2)
         with c1:
             if st.button("Reset to sample"):
-                st.session_state.bo_df = sample_df.copy()
+                reset_canvas(sample_df)
                 st.session_state.our_label = "Our Offer"
+        store = st.session_state.bo_store
         with c2:
             st.download_button(
                 "⬇️ Download current table (CSV)",
-                data=st.session_state.bo_df.to_csv(index=False),
+                data=store.view("csv", lambda: store.frame().to_csv(index=False)),
                 file_name="strategy_canvas_data.csv",
                 mime="text/csv",
             )
 
-    # Editor: keep constraints light to avoid fighting Chrome
+    # Editor: keep constraints light to avoid fighting Chrome. The base frame only changes on
+    # structural edits (rename, add competitor, reset); cell edits stay in the editor's own state.
     col_config = {
         "value_factor": st.column_config.TextColumn(
             "value_factor",
             help="Buyer value factor (e.g. Price, Speed, Support).",
         )
     }
-    for c in st.session_state.bo_df.columns:
-        if c != "value_factor":
-            col_config[c] = st.column_config.NumberColumn(
-                c,
-                help=f"Score for {c} (0–10).",
-                min_value=0,
-                max_value=10,
-            )
+    for c in store.series:
+        col_config[c] = st.column_config.NumberColumn(
+            c,
+            help=f"Score for {c} (0–10).",
+            min_value=0,
+            max_value=10,
+        )
 
-    df_raw = st.data_editor(
-        st.session_state.bo_df,
+    st.data_editor(
+        st.session_state.bo_base,
         num_rows="dynamic",
         use_container_width=True,
         column_config=col_config,
+        key=f"bo_editor_{st.session_state.bo_rev}",
     )
-    st.session_state.bo_df = df_raw.copy()
 
-# ---------- Validate & build numeric copy ----------
-if "value_factor" not in df_raw.columns:
-    st.error("Your data needs a 'value_factor' column.")
-    st.stop()
-
-series_cols = [c for c in df_raw.columns if c != "value_factor"]
+# ---------- Validate ----------
+series_cols = store.series
 if len(series_cols) < 2:
     st.error("Add at least two series columns (e.g., 'Our Offer' and one competitor).")
     st.stop()
 
-# Work on a separate numeric copy so we don't interfere with the editor
-df_calc = df_raw.copy()
-
-for col in series_cols:
-    df_calc[col] = pd.to_numeric(df_calc[col], errors="coerce")
-
-df_calc = df_calc.dropna(subset=series_cols, how="all")
-if df_calc.empty:
+factors, scores = store.canvas()
+if not len(factors):
     st.error("No valid numeric scores found.")
     st.stop()
 
-for col in series_cols:
-    df_calc[col] = df_calc[col].clip(0, 10)
-
-our_guess = next((c for c in series_cols if "our" in c.lower()), series_cols[0])
+our_guess = next((c for c in series_cols if "our" in str(c).lower()), series_cols[0])
 with st.sidebar:
     our_label_select = st.selectbox(
         "Select your series (Our Offer):",
@@ -464,88 +651,73 @@ with st.sidebar:
 # ---------- Strategy canvas chart ----------
 st.subheader("Strategy Canvas")
 
-long = df_calc.melt(id_vars="value_factor", var_name="Series", value_name="Score")
-
-# Branded colour mapping: Our Offer = teal, Competitor 1 = red, Competitor 2 = orange
-base_colors = {
-    "Our Offer": "#00E4AB",
-    "Competitor 1": "#F2003C",
-    "Competitor 2": "#fd7232",
-}
+axis_color = "#ffffff" if theme_choice == "Dark" else "#393939"
 
-# Build colour map for plotly based on series order
-color_discrete_map = {}
-palette_fallback = ["#7b61ff", "#f5b700", "#10b981", "#6366f1", "#ec4899"]
-fallback_index = 0
-for s in long["Series"].unique():
-    if s in base_colors:
-        color_discrete_map[s] = base_colors[s]
-    else:
-        if fallback_index < len(palette_fallback):
-            color_discrete_map[s] = palette_fallback[fallback_index]
-            fallback_index += 1
-        else:
-            color_discrete_map[s] = "#999999"
-
-fig = px.line(
-    long,
-    x="value_factor",
-    y="Score",
-    color="Series",
-    markers=True,
-    title="Strategy Canvas — Buyer Value Factors (0–10)",
-    color_discrete_map=color_discrete_map,
-)
 
-axis_color = "#ffffff" if theme_choice == "Dark" else "#393939"
+def canvas_figure():
+    fig = px.line(
+        store.long(),
+        x="value_factor",
+        y="Score",
+        color="Series",
+        markers=True,
+        title="Strategy Canvas — Buyer Value Factors (0–10)",
+        color_discrete_map=series_colors(tuple(series_cols)),
+    )
+    fig.update_layout(
+        xaxis_title="Buyer value factors",
+        yaxis_title="Performance (0–10)",
+        yaxis=dict(range=[0, 10]),
+        legend_title="Series",
+        title_font=dict(family="Inter", size=16, color=axis_color),
+        font=dict(family="Inter", color=axis_color),
+    )
+    fig.update_xaxes(showgrid=True, gridcolor="rgba(148,163,184,0.25)", linecolor="rgba(148,163,184,0.55)")
+    fig.update_yaxes(showgrid=True, gridcolor="rgba(148,163,184,0.25)", linecolor="rgba(148,163,184,0.55)")
+    return fig
 
-fig.update_layout(
-    xaxis_title="Buyer value factors",
-    yaxis_title="Performance (0–10)",
-    yaxis=dict(range=[0, 10]),
-    legend_title="Series",
-    title_font=dict(family="Inter", size=16, color=axis_color),
-    font=dict(family="Inter", color=axis_color),
-)
-fig.update_xaxes(showgrid=True, gridcolor="rgba(148,163,184,0.25)", linecolor="rgba(148,163,184,0.55)")
-fig.update_yaxes(showgrid=True, gridcolor="rgba(148,163,184,0.25)", linecolor="rgba(148,163,184,0.55)")
 
-st.plotly_chart(fig, use_container_width=True)
+st.plotly_chart(store.view(("canvas_fig", theme_choice), canvas_figure), use_container_width=True)
 
 # ---------- ERRC Grid ----------
 st.markdown("---")
 st.subheader("ERRC Grid (Eliminate · Reduce · Raise · Create)")
 
 competitor_cols = [c for c in series_cols if c != our_label_select]
-if competitor_cols:
-    comp_mean = df_calc[competitor_cols].mean(axis=1)
+ours_idx = series_cols.index(our_label_select)
+comp_idx = [series_cols.index(c) for c in competitor_cols]
+
+e1, e2, e3 = st.columns(3)
+reference = e1.selectbox(
+    "Compare against",
+    ["mean", "best", "peers"],
+    format_func={"mean": "Competitor average", "best": "Best competitor", "peers": "Peer set"}.get,
+)
+peer_cols = []
+if reference == "peers":
+    peer_cols = e1.multiselect("Peer set", competitor_cols, default=competitor_cols[:1])
+rule = e2.radio("Thresholds", ["fixed", "percentile"], horizontal=True,
+                format_func={"fixed": "Fixed gap", "percentile": "Percentiles"}.get)
+if rule == "fixed":
+    raise_at, reduce_at = e3.slider("Raise at or below / Reduce at or above", -5.0, 5.0, (-1.0, 1.0), 0.25)
+    low_pct, high_pct = 25.0, 75.0
 else:
-    comp_mean = pd.Series([np.nan] * len(df_calc), index=df_calc.index)
-
-gap = df_calc[our_label_select] - comp_mean
-suggest = []
-for i, row in df_calc.iterrows():
-    factor = row["value_factor"]
-    g = gap.loc[i] if not np.isnan(gap.loc[i]) else 0
-    if g <= -1.0:
-        action = "Raise"
-        rationale = "We underperform vs competitors here; raising this factor could unlock parity or differentiation."
-    elif g >= 1.0:
-        action = "Reduce"
-        rationale = "We overinvest vs competitors; consider reducing emphasis if not critical to ICP priorities."
-    else:
-        action = "Keep"
-        rationale = "Similar to competitors; keep as is unless ICP research says otherwise."
-    suggest.append(
-        {
-            "value_factor": factor,
-            "action": action,
-            "rationale": rationale,
-            "gap_vs_comp": round(float(g), 2),
-        }
-    )
-
-errc_df = pd.DataFrame(suggest)
+    low_pct, high_pct = e3.slider("Raise bottom / Reduce top (percentile of gaps)", 0, 100, (25, 75), 5)
+    raise_at, reduce_at = -1.0, 1.0
+
+errc_df = errc_table(
+    factors,
+    scores,
+    ours_idx,
+    comp_idx,
+    peers=[series_cols.index(c) for c in peer_cols],
+    reference=reference,
+    rule=rule,
+    raise_at=raise_at,
+    reduce_at=reduce_at,
+    low_pct=float(low_pct),
+    high_pct=float(high_pct),
+)
 st.info("Tip: Change 'action' per factor or add new rows for CREATE (new value factors).")
 errc_editable = st.data_editor(
     errc_df,
@@ -554,7 +726,7 @@ errc_editable = st.data_editor(
     column_config={
         "action": st.column_config.SelectboxColumn(
             "action",
-            options=["Eliminate", "Reduce", "Raise", "Create", "Keep"],
+            options=ERRC_ACTIONS,
         )
     },
 )
@@ -563,9 +735,10 @@ errc_editable = st.data_editor(
 st.markdown("---")
 st.subheader("Offer Differentiation Report")
 
-df_tmp = df_calc.copy()
-df_tmp["comp_mean"] = comp_mean
-df_tmp["gap_vs_comp"] = df_tmp[our_label_select] - df_tmp["comp_mean"]
+df_tmp = pd.DataFrame({
+    "value_factor": factors,
+    "gap_vs_comp": canvas_gaps(scores, ours_idx, comp_idx)["gap_vs_comp"],
+})
 under = df_tmp.nsmallest(3, "gap_vs_comp")[["value_factor", "gap_vs_comp"]]
 over = df_tmp.nlargest(3, "gap_vs_comp")[["value_factor", "gap_vs_comp"]]
 
@@ -603,3 +776,76 @@ st.download_button(
     file_name="errc_grid.csv",
     mime="text/csv",
 )
+
+# ---------- Competitor similarity ----------
+st.markdown("---")
+st.subheader("Competitor Similarity")
+
+canvas_key = hashlib.sha1(
+    scores.tobytes() + "\0".join(map(str, series_cols)).encode()
+).hexdigest()
+s1, s2 = st.columns(2)
+metric = s1.radio(
+    "Distance",
+    DISTANCE_METRICS,
+    horizontal=True,
+    format_func={"euclidean": "Euclidean", "cosine": "Cosine", "rank": "Rank correlation"}.get,
+)
+n_groups = s2.slider("Strategic groups", 1, max(2, min(10, len(series_cols))), min(3, len(series_cols)))
+sim = similarity(canvas_key, scores, metric)
+groups = cut_groups(sim["merges"], len(series_cols), n_groups)
+
+rivals = nearest_rivals(sim["dist"], ours_idx, k=5)
+st.markdown(f"**Nearest rivals to {our_label_select}**")
+st.dataframe(
+    pd.DataFrame({
+        "series": [series_cols[i] for i in rivals],
+        "distance": np.round(sim["dist"][ours_idx, rivals], 3),
+        "group": groups[rivals],
+    }),
+    use_container_width=True,
+    hide_index=True,
+)
+
+series_groups = pd.DataFrame({"series": series_cols, "group": groups})
+st.dataframe(
+    series_groups.groupby("group")["series"].agg(lambda s: ", ".join(map(str, s))).reset_index(),
+    use_container_width=True,
+    hide_index=True,
+)
+
+if st.checkbox("Show similarity map", value=True):
+    map_df = series_groups.assign(
+        x=sim["xy"][:, 0],
+        y=sim["xy"][:, 1],
+        group=series_groups["group"].astype(str),
+        ours=np.where(np.arange(len(series_cols)) == ours_idx, "Ours", "Competitor"),
+    )
+    map_fig = px.scatter(
+        map_df,
+        x="x",
+        y="y",
+        color="group",
+        symbol="ours",
+        hover_name="series",
+        text="series" if len(series_cols) <= MAP_LABEL_MAX else None,
+        title="Strategy map — closer series compete on similar profiles",
+    )
+    map_fig.update_traces(textposition="top center", marker=dict(size=11))
+    map_fig.update_layout(
+        xaxis_title="",
+        yaxis_title="",
+        legend_title="Group",
+        title_font=dict(family="Inter", size=16, color=axis_color),
+        font=dict(family="Inter", color=axis_color),
+    )
+    map_fig.update_xaxes(showticklabels=False, showgrid=True, gridcolor="rgba(148,163,184,0.25)")
+    map_fig.update_yaxes(showticklabels=False, showgrid=True, gridcolor="rgba(148,163,184,0.25)")
+    st.plotly_chart(map_fig, use_container_width=True)
+
+st.download_button(
+    "⬇️ Download distance matrix (CSV)",
+    data=pd.DataFrame(np.round(sim["dist"], 4), index=series_cols, columns=series_cols).to_csv(),
+    file_name=f"series_distances_{metric}.csv",
+    mime="text/csv",
+)
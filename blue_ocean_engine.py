@@ -0,0 +1,521 @@
+# Blue Ocean engine – strategy canvas gaps and ERRC suggestions as array operations, importable without Streamlit
+
+from __future__ import annotations
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+SCORE_MIN, SCORE_MAX = 0.0, 10.0
+ERRC_ACTIONS = ["Eliminate", "Reduce", "Raise", "Create", "Keep"]
+GAP_REFERENCES = {"mean": "gap_vs_comp", "best": "gap_vs_best", "peers": "gap_vs_peers"}
+RATIONALE = {
+    "Raise": "We underperform vs competitors here; raising this factor could unlock parity or differentiation.",
+    "Reduce": "We overinvest vs competitors; consider reducing emphasis if not critical to ICP priorities.",
+    "Keep": "Similar to competitors; keep as is unless ICP research says otherwise.",
+}
+
+
+# ---------- Canvas ----------
+def canvas_matrix(df: pd.DataFrame, series_cols: list[str]) -> np.ndarray:
+    """Scores as a (factors, series) float array clipped to 0–10; unreadable cells are NaN."""
+    block = df[series_cols]
+    # Coerce only the columns that are not numeric already (typed-in text from the editor, CSV junk)
+    text = [c for c in series_cols if not pd.api.types.is_numeric_dtype(block[c])]
+    if text:
+        block = block.assign(**{c: pd.to_numeric(block[c], errors="coerce") for c in text})
+    return np.clip(block.to_numpy(dtype=float), SCORE_MIN, SCORE_MAX)
+
+
+def _row_mean(block: np.ndarray) -> np.ndarray:
+    # Mean over the columns present per row; NaN (without a warning) when a row has none
+    counts = np.isfinite(block).sum(axis=1)
+    sums = np.where(np.isfinite(block), block, 0.0).sum(axis=1)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _row_max(block: np.ndarray) -> np.ndarray:
+    filled = np.where(np.isfinite(block), block, -np.inf)
+    best = filled.max(axis=1, initial=-np.inf)
+    return np.where(np.isfinite(best), best, np.nan)
+
+
+def canvas_gaps(scores: np.ndarray, ours: int, competitors: list[int], peers: list[int] | None = None) -> dict:
+    """Our score minus the competitor mean, the best competitor and the peer-set mean, per factor."""
+    our = scores[:, ours]
+    comp = scores[:, competitors] if competitors else np.full((len(scores), 0), np.nan)
+    gaps = {
+        "comp_mean": _row_mean(comp),
+        "comp_best": _row_max(comp),
+    }
+    gaps["gap_vs_comp"] = our - gaps["comp_mean"]
+    gaps["gap_vs_best"] = our - gaps["comp_best"]
+    if peers:
+        gaps["peer_mean"] = _row_mean(scores[:, peers])
+        gaps["gap_vs_peers"] = our - gaps["peer_mean"]
+    return gaps
+
+
+class CanvasStore:
+    """Strategy canvas held as typed arrays: factor labels, series labels and a (factors, series) score grid.
+
+    The grid is the long format with implicit ids — cell (f, s) is factor id f, series id s — so an
+    edit is a single write. Rows map one-to-one onto the data editor's base frame, followed by the
+    rows added in the editor; deleted rows are masked out. Views (wide frame, long frame, the numeric
+    canvas) are built once per version.
+    """
+
+    def __init__(self, factors, series, scores):
+        self.factors = np.array(factors, dtype=object)
+        self.series = list(series)
+        self.scores = np.clip(np.array(scores, dtype=float).reshape(len(self.factors), len(self.series)),
+                              SCORE_MIN, SCORE_MAX)
+        self.base_rows = len(self.factors)
+        self.live = np.ones(self.base_rows, dtype=bool)
+        self.version = 0
+        self._col = {c: j for j, c in enumerate(self.series)}
+        self._views = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CanvasStore":
+        series = [c for c in df.columns if c != "value_factor"]
+        return cls(df["value_factor"].to_numpy(dtype=object), series, canvas_matrix(df, series))
+
+    def view(self, name, build):
+        """Memoise `build()` until the next change to the canvas."""
+        if name not in self._views:
+            self._views[name] = build()
+        return self._views[name]
+
+    def _write(self, row: int, column, value) -> bool:
+        if column == "value_factor":
+            if self.factors[row] == value:
+                return False
+            self.factors[row] = value
+            return True
+        j = self._col.get(column)
+        if j is None:
+            return False
+        try:
+            new = min(max(float(value), SCORE_MIN), SCORE_MAX)
+        except (TypeError, ValueError):
+            new = np.nan
+        old = self.scores[row, j]
+        if old == new or (np.isnan(old) and np.isnan(new)):
+            return False
+        self.scores[row, j] = new
+        return True
+
+    def apply_editor(self, state: dict) -> bool:
+        """Fold a data editor's edit state (edited/added/deleted rows) in; only differing cells are written."""
+        changed = False
+        added = state.get("added_rows") or []
+        n = self.base_rows + len(added)
+        if n != len(self.factors):
+            # The added block changed shape: blank it and rewrite it from the editor's list
+            keep = min(n, self.base_rows)
+            self.factors = np.concatenate([self.factors[:keep], np.full(n - keep, None, dtype=object)])
+            self.scores = np.vstack([self.scores[:keep], np.full((n - keep, len(self.series)), np.nan)])
+            changed = True
+        for row, cells in (state.get("edited_rows") or {}).items():
+            row = int(row)
+            if row < self.base_rows:
+                for column, value in cells.items():
+                    changed |= self._write(row, column, value)
+        for k, cells in enumerate(added):
+            for column, value in cells.items():
+                changed |= self._write(self.base_rows + k, column, value)
+        live = np.ones(n, dtype=bool)
+        deleted = [int(r) for r in state.get("deleted_rows") or [] if int(r) < self.base_rows]
+        live[deleted] = False
+        if not np.array_equal(live, self.live):
+            self.live = live
+            changed = True
+        if changed:
+            self._changed()
+        return changed
+
+    def _changed(self):
+        self.version += 1
+        self._views.clear()
+
+    def add_series(self, name: str, fill: float = np.nan):
+        """Append one series column with every factor scored `fill`; existing cells are left as they are."""
+        if name in self._col:
+            return
+        column = np.full((len(self.factors), 1), min(max(float(fill), SCORE_MIN), SCORE_MAX))
+        self.scores = np.hstack([self.scores, column])
+        self._col[name] = len(self.series)
+        self.series.append(name)
+        self._changed()
+
+    def rename_series(self, old: str, new: str):
+        """Relabel a series in place; its scores do not move."""
+        if old not in self._col or new in self._col:
+            return
+        j = self._col.pop(old)
+        self.series[j] = new
+        self._col[new] = j
+        self._changed()
+
+    def rebase(self):
+        """Make the live rows the new base, for an editor session restarted on `frame()`."""
+        if len(self.factors) != self.base_rows or not self.live.all():
+            self.factors = self.factors[self.live]
+            self.scores = self.scores[self.live]
+        self.base_rows = len(self.factors)
+        self.live = np.ones(self.base_rows, dtype=bool)
+
+    def frame(self) -> pd.DataFrame:
+        """Wide frame of the live rows; integral series come back as nullable ints."""
+        def build():
+            grid = self.scores[self.live]
+            df = pd.DataFrame(grid, columns=self.series)
+            whole = (np.isnan(grid) | (grid == np.round(grid))).all(axis=0)
+            for c in np.asarray(self.series, dtype=object)[whole]:
+                df[c] = df[c].astype("Int64")
+            df.insert(0, "value_factor", self.factors[self.live])
+            return df
+        return self.view("frame", build)
+
+    def canvas(self) -> tuple[np.ndarray, np.ndarray]:
+        """(factor labels, scores) for live rows with at least one score — what the charts and ERRC read."""
+        def build():
+            keep = self.live & np.isfinite(self.scores).any(axis=1)
+            return self.factors[keep], self.scores[keep]
+        return self.view("canvas", build)
+
+    def long(self) -> pd.DataFrame:
+        """value_factor / Series / Score rows in factor-major order, without a melt."""
+        def build():
+            factors, scores = self.canvas()
+            return pd.DataFrame({
+                "value_factor": np.repeat(factors, len(self.series)),
+                "Series": np.tile(np.asarray(self.series, dtype=object), len(factors)),
+                "Score": scores.ravel(),
+            })
+        return self.view("long", build)
+
+
+# ---------- ERRC ----------
+def errc_thresholds(gap: np.ndarray, rule: str = "fixed", raise_at: float = -1.0, reduce_at: float = 1.0,
+                    low_pct: float = 25.0, high_pct: float = 75.0) -> tuple[float, float]:
+    """(raise_at, reduce_at) gap cut-offs: fixed values, or percentiles of this canvas's own gaps."""
+    if rule == "percentile":
+        finite = gap[np.isfinite(gap)]
+        if not len(finite):
+            return -np.inf, np.inf
+        lo, hi = float(np.percentile(finite, low_pct)), float(np.percentile(finite, high_pct))
+        # A flat canvas collapses the cut-offs; flag nothing rather than every factor
+        return (lo, hi) if lo < hi else (-np.inf, np.inf)
+    return raise_at, reduce_at
+
+
+def errc_table(
+    factors,
+    scores: np.ndarray,
+    ours: int,
+    competitors: list[int],
+    peers: list[int] | None = None,
+    reference: str = "mean",
+    rule: str = "fixed",
+    raise_at: float = -1.0,
+    reduce_at: float = 1.0,
+    low_pct: float = 25.0,
+    high_pct: float = 75.0,
+) -> pd.DataFrame:
+    """ERRC suggestion per factor from one pass over the canvas.
+
+    `reference` picks the gap that drives the action (competitor mean, best competitor or the
+    peer set); a gap at or below the raise cut-off suggests Raise, at or above the reduce cut-off
+    Reduce, otherwise Keep. Missing gaps count as 0, as in the original grid.
+    """
+    gaps = canvas_gaps(scores, ours, competitors, peers)
+    if reference == "peers" and not peers:
+        reference = "mean"
+    key = GAP_REFERENCES[reference]
+    gap = np.nan_to_num(gaps[key], nan=0.0)
+    lo, hi = errc_thresholds(gaps[key], rule, raise_at, reduce_at, low_pct, high_pct)
+    action = np.select([gap <= lo, gap >= hi], ["Raise", "Reduce"], default="Keep")
+    out = pd.DataFrame(
+        {
+            "value_factor": np.asarray(factors, dtype=object),
+            "action": action,
+            "rationale": pd.Series(action).map(RATIONALE).to_numpy(),
+            "gap_vs_comp": np.round(np.nan_to_num(gaps["gap_vs_comp"], nan=0.0), 2),
+            "gap_vs_best": np.round(gaps["gap_vs_best"], 2),
+        }
+    )
+    if "gap_vs_peers" in gaps:
+        out["gap_vs_peers"] = np.round(gaps["gap_vs_peers"], 2)
+    return out
+
+
+# ---------- Similarity ----------
+DISTANCE_METRICS = ["euclidean", "cosine", "rank"]
+
+
+def _filled(scores: np.ndarray) -> np.ndarray:
+    # Series as rows; a missing score takes the factor's mean across series so it neither helps nor hurts
+    fill = np.nan_to_num(_row_mean(scores), nan=0.0)
+    return np.where(np.isfinite(scores), scores, fill[:, None]).T
+
+
+def series_distances(scores: np.ndarray, metric: str = "euclidean") -> np.ndarray:
+    """(series, series) distance matrix from one Gram product over the canvas.
+
+    euclidean: straight-line distance between score profiles; cosine: 1 − cosine similarity;
+    rank: 1 − Spearman correlation of the factor rankings. Flat series sit at distance 1 from
+    every other series under cosine and rank.
+    """
+    X = _filled(scores)
+    if metric == "euclidean":
+        sq = (X * X).sum(axis=1)
+        d2 = sq[:, None] + sq[None, :] - 2.0 * (X @ X.T)
+        dist = np.sqrt(np.maximum(d2, 0.0))
+    else:
+        if metric == "rank":
+            # Average ranks across factors per series, then Pearson on the ranks
+            X = pd.DataFrame(X.T).rank(axis=0).to_numpy().T
+            X = X - X.mean(axis=1, keepdims=True)
+        elif metric != "cosine":
+            raise ValueError(f"Unknown metric: {metric}")
+        norm = np.linalg.norm(X, axis=1)
+        ok = norm > 1e-12
+        U = np.where(ok[:, None], X / np.where(ok, norm, 1.0)[:, None], 0.0)
+        dist = np.clip(1.0 - U @ U.T, 0.0, 2.0)
+        flat = ~(ok[:, None] & ok[None, :])
+        dist[flat] = 1.0
+    np.fill_diagonal(dist, 0.0)
+    return dist
+
+
+def nearest_rivals(dist: np.ndarray, target: int, k: int = 5) -> np.ndarray:
+    """Indices of the k series closest to `target`, nearest first."""
+    d = dist[target].astype(float)
+    d[target] = np.inf
+    k = min(k, len(d) - 1)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(d, k - 1)[:k]
+    return idx[np.argsort(d[idx], kind="stable")]
+
+
+def average_linkage(dist: np.ndarray) -> np.ndarray:
+    """Agglomerative merges (n − 1, 2) under average linkage; merged clusters get ids n, n + 1, ..."""
+    n = len(dist)
+    D = np.array(dist, dtype=float)
+    np.fill_diagonal(D, np.inf)
+    size = np.ones(n)
+    ids = np.arange(n)
+    merges = np.empty((max(n - 1, 0), 2), dtype=np.int64)
+    for step in range(n - 1):
+        i, j = divmod(int(np.argmin(D)), n)
+        if i > j:
+            i, j = j, i
+        merges[step] = ids[i], ids[j]
+        # Lance–Williams update: the merged cluster takes slot i, slot j is retired
+        row = (size[i] * D[i] + size[j] * D[j]) / (size[i] + size[j])
+        D[i, :] = row
+        D[:, i] = row
+        D[i, i] = np.inf
+        D[j, :] = np.inf
+        D[:, j] = np.inf
+        size[i] += size[j]
+        ids[i] = n + step
+    return merges
+
+
+def cut_groups(merges: np.ndarray, n: int, k: int) -> np.ndarray:
+    """Group label (1..k, in order of first appearance) per series after replaying n − k merges."""
+    k = int(np.clip(k, 1, max(n, 1)))
+    parent = np.arange(2 * n - 1) if n else np.empty(0, dtype=np.int64)
+    for step, (a, b) in enumerate(merges[: n - k]):
+        parent[a] = parent[b] = n + step
+    # Parents always have larger ids than their children, so one descending pass resolves roots
+    root = parent.copy()
+    for c in range(len(root) - 1, -1, -1):
+        root[c] = root[parent[c]] if parent[c] != c else c
+    return pd.factorize(root[:n])[0] + 1
+
+
+def canvas_map(dist: np.ndarray) -> np.ndarray:
+    """(series, 2) coordinates from classical MDS on the distance matrix (PCA for euclidean)."""
+    n = len(dist)
+    d2 = np.asarray(dist, dtype=float) ** 2
+    B = -0.5 * (d2 - d2.mean(axis=0) - d2.mean(axis=1)[:, None] + d2.mean())
+    vals, vecs = np.linalg.eigh(B)
+    top = np.argsort(vals)[::-1][:2]
+    xy = vecs[:, top] * np.sqrt(np.maximum(vals[top], 0.0))
+    if xy.shape[1] < 2:
+        xy = np.hstack([xy, np.zeros((n, 2 - xy.shape[1]))])
+    return xy
+
+
+# ---------- Portfolio ----------
+def our_series(series: list) -> int:
+    """Index of the series that looks like ours ("Our Offer", "our brand", ...), else the first."""
+    return next((i for i, c in enumerate(series) if "our" in str(c).lower()), 0)
+
+
+def parse_canvas(data: bytes) -> dict:
+    """One canvas CSV (strategy_canvas_template.csv layout) as factor labels, series labels and scores."""
+    # Arrow's reader releases the GIL, so the loader's threads parse files side by side
+    table = pacsv.read_csv(pa.BufferReader(data), read_options=pacsv.ReadOptions(use_threads=False))
+    names = table.column_names
+    if "value_factor" not in names:
+        raise ValueError("missing a 'value_factor' column")
+    series = [i for i, c in enumerate(names) if c != "value_factor"]
+    if len(series) < 2:
+        raise ValueError("needs our series and at least one competitor")
+    cols = []
+    for i in series:
+        col = table.column(i)
+        if pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+            cols.append(col.to_numpy().astype(float))
+        else:
+            cols.append(pd.to_numeric(col.to_pandas(), errors="coerce").to_numpy(dtype=float))
+    scores = np.clip(np.column_stack(cols), SCORE_MIN, SCORE_MAX)
+    labels = table.column(names.index("value_factor")).cast(pa.string()).to_numpy(zero_copy_only=False)
+    labels = np.array([str(v).strip() if v is not None else "" for v in labels], dtype=object)
+    keep = (labels != "") & np.isfinite(scores).any(axis=1)
+    return {
+        "factors": labels[keep],
+        "series": [names[i] for i in series],
+        "scores": scores[keep],
+        "ours": our_series([names[i] for i in series]),
+    }
+
+
+def load_canvases(sources: list[tuple[str, object]], cache, workers: int | None = None):
+    """Parse (name, bytes or path) sources on a thread pool; each file is cached under its content hash.
+
+    Returns ([(name, digest, canvas)], [(name, error)]) in source order.
+    """
+    def load(source):
+        name, src = source
+        try:
+            if isinstance(src, (bytes, bytearray)):
+                data = bytes(src)
+            else:
+                with open(src, "rb") as f:
+                    data = f.read()
+            digest = hashlib.sha1(data).hexdigest()
+            return name, digest, cache.get_or_compute("canvas-" + digest, lambda: parse_canvas(data)), None
+        except Exception as e:
+            return name, None, None, f"{type(e).__name__}: {e}"
+
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sources) or 1))) as pool:
+        results = list(pool.map(load, sources))
+    loaded = [(name, digest, canvas) for name, digest, canvas, err in results if err is None]
+    errors = [(name, err) for name, _, _, err in results if err is not None]
+    return loaded, errors
+
+
+def build_portfolio(loaded: list[tuple[str, str, dict]]) -> dict:
+    """Stack canvases into one columnar dataset: one row per (canvas, factor), competitor cells ragged.
+
+    Factors share a dictionary keyed on their case-folded label; `comp` holds every competitor score
+    row by row and `comp_start` is each row's offset into it.
+    """
+    names, row_canvas, labels, ours, comp, n_comp, n_series = [], [], [], [], [], [], []
+    for c, (name, _, canvas) in enumerate(loaded):
+        grid = canvas["scores"]
+        others = np.delete(np.arange(grid.shape[1]), canvas["ours"])
+        names.append(name)
+        row_canvas.append(np.full(len(grid), c, dtype=np.int32))
+        labels.append(canvas["factors"])
+        ours.append(grid[:, canvas["ours"]])
+        comp.append(grid[:, others].ravel())
+        n_comp.append(np.full(len(grid), len(others), dtype=np.int64))
+        n_series.append(len(others))
+    if not names:
+        raise ValueError("No canvases to compare.")
+    labels = np.concatenate(labels)
+    codes, _ = pd.factorize(pd.Series(labels, dtype="string").str.casefold(), sort=False)
+    # Display each dictionary entry under the first spelling seen
+    first = pd.Series(np.arange(len(codes))).groupby(codes).first().to_numpy()
+    counts = np.concatenate(n_comp)
+    return {
+        "canvases": names,
+        "competitors": np.asarray(n_series, dtype=np.int64),
+        "factor_labels": labels[first],
+        "row_canvas": np.concatenate(row_canvas),
+        "row_factor": codes.astype(np.int32),
+        "ours": np.concatenate(ours),
+        "comp": np.concatenate(comp),
+        "comp_start": np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64),
+    }
+
+
+def portfolio_errc(data: dict, reference: str = "mean", raise_at: float = -1.0, reduce_at: float = 1.0) -> pd.DataFrame:
+    """Gap statistics and ERRC action for every (canvas, factor) row in one pass over the dataset."""
+    comp, start = data["comp"], data["comp_start"]
+    finite = np.isfinite(comp)
+    if len(start):
+        sums = np.add.reduceat(np.where(finite, comp, 0.0), start)
+        counts = np.add.reduceat(finite.astype(np.int64), start)
+        best = np.fmax.reduceat(comp, start)
+    else:
+        sums = counts = best = np.empty(0)
+    comp_mean = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    gap_vs_comp = data["ours"] - comp_mean
+    gap_vs_best = data["ours"] - best
+    gap = np.nan_to_num(gap_vs_best if reference == "best" else gap_vs_comp, nan=0.0)
+    action = np.select([gap <= raise_at, gap >= reduce_at], ["Raise", "Reduce"], default="Keep")
+    return pd.DataFrame({
+        "canvas": pd.Categorical.from_codes(data["row_canvas"], categories=data["canvases"]),
+        "value_factor": data["factor_labels"][data["row_factor"]],
+        "factor_id": data["row_factor"],
+        "ours": data["ours"],
+        "comp_mean": np.round(comp_mean, 2),
+        "comp_best": best,
+        "gap_vs_comp": np.round(gap_vs_comp, 2),
+        "gap_vs_best": np.round(gap_vs_best, 2),
+        "gap": gap,
+        "action": action,
+    })
+
+
+def headroom_ranking(errc: pd.DataFrame, data: dict) -> pd.DataFrame:
+    """Clients ranked by differentiation headroom.
+
+    headroom: total |gap| on factors the grid flags to Raise or Reduce, divided by the canvas's
+    factor count — how much the ERRC moves would shift the curve away from the herd per factor.
+    divergence: mean |gap| over all factors — how distinct the curve already is.
+    """
+    canvas = errc["canvas"].cat.codes.to_numpy()
+    n = len(data["canvases"])
+    size = np.bincount(canvas, minlength=n)
+    flagged = (errc["action"] != "Keep").to_numpy()
+    magnitude = np.abs(errc["gap"].to_numpy())
+    out = pd.DataFrame({
+        "canvas": data["canvases"],
+        "factors": size,
+        "competitors": data["competitors"],
+        "raise": np.bincount(canvas, weights=(errc["action"] == "Raise").to_numpy(), minlength=n).astype(int),
+        "reduce": np.bincount(canvas, weights=(errc["action"] == "Reduce").to_numpy(), minlength=n).astype(int),
+        "divergence": np.bincount(canvas, weights=magnitude, minlength=n) / np.maximum(size, 1),
+        "headroom": np.bincount(canvas, weights=magnitude * flagged, minlength=n) / np.maximum(size, 1),
+    })
+    out = out.sort_values(["headroom", "canvas"], ascending=[False, True], kind="stable").reset_index(drop=True)
+    out.insert(0, "rank", np.arange(1, len(out) + 1))
+    return out.round({"divergence": 2, "headroom": 2})
+
+
+def factor_summary(errc: pd.DataFrame, data: dict) -> pd.DataFrame:
+    """Per dictionary factor: canvases using it, action counts and the mean gap across the portfolio."""
+    fid = errc["factor_id"].to_numpy()
+    k = len(data["factor_labels"])
+    counts = np.bincount(fid, minlength=k)
+    out = pd.DataFrame({"value_factor": data["factor_labels"], "canvases": counts})
+    for a in ("Raise", "Reduce", "Keep"):
+        out[a.lower()] = np.bincount(fid, weights=(errc["action"] == a).to_numpy(), minlength=k).astype(int)
+    out["mean_gap"] = np.round(np.bincount(fid, weights=errc["gap"].to_numpy(), minlength=k) / np.maximum(counts, 1), 2)
+    return out.sort_values(["canvases", "value_factor"], ascending=[False, True], kind="stable").reset_index(drop=True)
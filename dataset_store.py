@@ -0,0 +1,131 @@
+# Shared dataset store – one immutable Arrow table per distinct upload, shared by every Streamlit session
+
+from __future__ import annotations
+
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+
+DEFAULT_BUDGET_BYTES = 2 * 1024 ** 3
+
+
+class DatasetHandle:
+    """Per-session view on a shared table; releases its reference when the session drops it."""
+
+    def __init__(self, store: "DatasetStore", key: str, table: pa.Table):
+        self.key = key
+        self.table = table
+        self._store = store
+        weakref.finalize(self, store.release, key)
+
+    @property
+    def columns(self) -> list[str]:
+        return self.table.column_names
+
+    def to_pandas(self, columns: list[str] | None = None) -> pd.DataFrame:
+        table = self.table.select(columns) if columns else self.table
+        return table.to_pandas()
+
+    def frame(self) -> pd.DataFrame:
+        """The whole table as one pandas frame shared through the store; treat it as read-only."""
+        return self._store.frame(self.key)
+
+
+def _entry_bytes(entry: list) -> int:
+    return entry[0].nbytes + entry[3]
+
+
+class DatasetStore:
+    """Process-wide, reference-counted registry of immutable tables with LRU eviction.
+
+    A table's pandas frame, once built, lives in the same entry: it counts towards the budget
+    and is dropped with the table.
+    """
+
+    def __init__(self, budget_bytes: int = DEFAULT_BUDGET_BYTES, on_evict=None):
+        self.budget_bytes = budget_bytes
+        self.on_evict = on_evict  # called with the key after a table is dropped, e.g. to delete its backing file
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, list] = OrderedDict()  # key -> [table, refs, frame, frame bytes]
+
+    def acquire(self, key: str, loader) -> DatasetHandle:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self._entries.move_to_end(key)
+                return DatasetHandle(self, key, entry[0])
+        # Parse outside the lock so other sessions are not blocked; first writer wins on a race
+        table = loader()
+        with self._lock:
+            entry = self._entries.setdefault(key, [table, 0, None, 0])
+            entry[1] += 1
+            self._entries.move_to_end(key)
+            evicted = self._evict()
+            handle = DatasetHandle(self, key, entry[0])
+        self._notify(evicted)
+        return handle
+
+    def frame(self, key: str) -> pd.DataFrame:
+        """Pandas frame of an acquired table, converted once and shared by every handle."""
+        with self._lock:
+            entry = self._entries[key]
+            if entry[2] is not None:
+                return entry[2]
+            table = entry[0]
+        # Convert outside the lock; first writer wins on a race
+        df = table.to_pandas()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return df
+            if entry[2] is None:
+                entry[2], entry[3] = df, int(df.memory_usage(deep=True).sum())
+            df = entry[2]
+            evicted = self._evict()
+        self._notify(evicted)
+        return df
+
+    def release(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            evicted = []
+            if entry is not None:
+                entry[1] = max(0, entry[1] - 1)
+                evicted = self._evict()
+        self._notify(evicted)
+
+    def _evict(self) -> list[str]:
+        # Only unreferenced tables free memory when dropped; walk them oldest-first until under budget
+        total = sum(_entry_bytes(e) for e in self._entries.values())
+        evicted = []
+        for key in list(self._entries):
+            if total <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry[1] == 0:
+                del self._entries[key]
+                total -= _entry_bytes(entry)
+                evicted.append(key)
+        return evicted
+
+    def _notify(self, evicted: list[str]):
+        # Outside the lock: the callback may touch the filesystem
+        if self.on_evict is not None:
+            for key in evicted:
+                self.on_evict(key)
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "datasets": len(self._entries),
+                "bytes": sum(_entry_bytes(e) for e in self._entries.values()),
+                "viewers": sum(e[1] for e in self._entries.values()),
+            }
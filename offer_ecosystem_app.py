@@ -1,9 +1,34 @@
+import os
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
+from offer_ecosystem_engine import (
+    TIERS,
+    clean_flows,
+    clean_offers,
+    condense_links,
+    input_hash,
+    monte_carlo,
+    monthly_simulation,
+    monthly_table,
+    offer_model,
+    offer_table,
+    one_at_a_time,
+    optimize_prices,
+    percentile_table,
+    sobol_indices,
+    state_links,
+    tier_links,
+    tier_table,
+)
+from purchase_flows import estimate_flows, log_columns
+from scenario_store import ScenarioStore
+from upload_ingest import spill_upload
+
 # -----------------------
 # Global visual defaults
 # -----------------------
@@ -169,8 +194,6 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-TIERS = ["Entry", "Core", "Premium", "Upsell", "Recurring"]
-
 # -----------------------
 # Sample data
 # -----------------------
@@ -252,10 +275,62 @@ def read_or_default(uploaded_list):
     return frames
 
 
+@st.cache_data(show_spinner="Estimating flows from the purchase log…")
+def estimate_log_flows(path, customer_col, offer_col, date_col, state_map, min_transitions):
+    return estimate_flows(path, customer_col, offer_col, date_col, state_map, min_transitions)
+
+
 if mode == "Upload CSVs":
     with st.sidebar:
         uploads = st.file_uploader("Upload CSV files", type=["csv"], accept_multiple_files=True)
+        st.caption("Or estimate flows from a purchase log (one row per customer × offer × date).")
+        log_up = st.file_uploader("Purchase log", type=["csv", "parquet"], key="purchase_log")
     frames = read_or_default(uploads)
+
+    if log_up is not None:
+        # Re-spill if the analyzer's spill sweep removed the file since the last rerun
+        if st.session_state.get("log_id") != log_up.file_id or not os.path.exists(st.session_state.log_path):
+            st.session_state.log_key, st.session_state.log_path = spill_upload(log_up)
+            st.session_state.log_id = log_up.file_id
+        log_cols = log_columns(st.session_state.log_path)
+
+        def pick(label, name):
+            return st.selectbox(label, log_cols, index=log_cols.index(name) if name in log_cols else 0)
+
+        with st.sidebar:
+            cust_col = pick("Customer column", "customer")
+            offer_col = pick("Offer column", "offer")
+            date_col = pick("Date column", "date")
+            level = st.radio("Flow level", ["Tier", "Offer"], horizontal=True)
+            min_trans = st.number_input("Min transitions per flow", min_value=1, value=5, step=1)
+
+        state_map = None
+        if level == "Tier":
+            state_map = dict(zip(frames["offers"]["offer"].astype(str).str.strip(), frames["offers"]["tier"].astype(str)))
+        try:
+            est = estimate_log_flows(
+                st.session_state.log_path, cust_col, offer_col, date_col, state_map, int(min_trans)
+            )
+        except Exception as e:
+            st.error(f"Could not read the purchase log: {e}")
+            st.stop()
+        frames["flows"] = est["flows"]
+
+        st.subheader("Flows estimated from purchase log")
+        st.caption(
+            f"{est['rows']:,} rows read, {est['dropped']:,} skipped (missing customer, offer or date). "
+            "prob = transitions ÷ purchases of the source; prob_low/high is a 95% Wilson interval; "
+            "p25/p50/p75_days is the time between the two purchases."
+        )
+        st.dataframe(est["flows"].round(3), use_container_width=True, hide_index=True)
+        with st.expander("First purchases (where customers enter)"):
+            st.dataframe(est["entries"], use_container_width=True)
+        st.download_button(
+            "⬇️ Download estimated flows.csv",
+            est["flows"].to_csv(index=False),
+            "flows.csv",
+            "text/csv",
+        )
 else:
     if "eco_frames" not in st.session_state:
         st.session_state.eco_frames = {
@@ -286,7 +361,7 @@ else:
     # Offers editor
     st.subheader("Offers (tiers & economics)")
     st.caption(
-        "tier (Entry/Core/Premium/Upsell/Recurring), price (one-time), "
+        "tier (Entry/Core/Premium/Upsell/Recurring or your own label), price (one-time), "
         "mrr (monthly), term_months (recurring), margin_pct (0–1)"
     )
     st.session_state.eco_frames["offers"] = st.data_editor(
@@ -294,7 +369,7 @@ else:
         num_rows="dynamic",
         use_container_width=True,
         column_config={
-            "tier": st.column_config.SelectboxColumn("tier", options=TIERS),
+            "tier": st.column_config.TextColumn("tier", help="Entry/Core/Premium/Upsell/Recurring or a custom tier"),
             "margin_pct": st.column_config.NumberColumn(
                 "margin_pct", min_value=0.0, max_value=1.0, step=0.05
             ),
@@ -305,15 +380,25 @@ else:
     )
 
     # Flows editor
-    st.subheader("Flows (tier-level)")
-    st.caption("Probabilities (0–1) define % moving from source → target per period/cohort.")
+    st.subheader("Flows (offer- or tier-level)")
+    st.caption(
+        "Probabilities (0–1) define % moving from source → target per period/cohort. An endpoint is an "
+        "offer name or a tier; a tier target splits the flow evenly across that tier's offers."
+    )
+    endpoint_options = list(dict.fromkeys(
+        TIERS
+        + st.session_state.eco_frames["offers"]["offer"].dropna().astype(str).tolist()
+        + st.session_state.eco_frames["offers"]["tier"].dropna().astype(str).tolist()
+        + st.session_state.eco_frames["flows"]["source_tier"].dropna().astype(str).tolist()
+        + st.session_state.eco_frames["flows"]["target_tier"].dropna().astype(str).tolist()
+    ))
     st.session_state.eco_frames["flows"] = st.data_editor(
         st.session_state.eco_frames["flows"],
         num_rows="dynamic",
         use_container_width=True,
         column_config={
-            "source_tier": st.column_config.SelectboxColumn("source_tier", options=TIERS),
-            "target_tier": st.column_config.SelectboxColumn("target_tier", options=TIERS),
+            "source_tier": st.column_config.SelectboxColumn("source_tier", options=endpoint_options),
+            "target_tier": st.column_config.SelectboxColumn("target_tier", options=endpoint_options),
             "prob": st.column_config.NumberColumn("prob", min_value=0.0, max_value=1.0, step=0.05),
         },
     )
@@ -335,84 +420,48 @@ with st.sidebar:
         "Recurring term for MRR (months)", min_value=1, value=12, step=1
     )
 
+    st.header("Monthly timeline")
+    horizon = st.slider("Horizon (months)", min_value=36, max_value=60, value=36, step=6)
+    monthly_new = st.number_input(
+        "New Entry customers per month (after month 1)", min_value=0, value=0, step=50
+    )
+    churn = st.number_input(
+        "Recurring churn (% per month)", min_value=0.0, max_value=100.0, value=3.0, step=0.5
+    ) / 100.0
+
 # -----------------------
 # Clean + finance calc
 # -----------------------
-offers["enabled"] = offers["enabled"].astype(bool)
-offers = offers[offers["enabled"]]
-offers["tier"] = offers["tier"].astype(str)
-
-for c in ["price", "mrr", "term_months", "margin_pct"]:
-    offers[c] = pd.to_numeric(offers[c], errors="coerce").fillna(0.0)
-
-flows["prob"] = pd.to_numeric(flows["prob"], errors="coerce").fillna(0.0)
-flows = flows[
-    flows["source_tier"].isin(TIERS) & flows["target_tier"].isin(TIERS)
-]
-
-tier_fin = (
-    offers.groupby("tier")
-    .agg(
-        avg_price=("price", "mean"),
-        avg_mrr=("mrr", "mean"),
-        avg_term=("term_months", "mean"),
-        avg_margin=("margin_pct", "mean"),
-        n_offers=("offer", "count"),
-    )
-    .reindex(TIERS)
-    .fillna(0.0)
-    .reset_index()
-)
+offers = clean_offers(offers)
+flows = clean_flows(flows)
 
-cust = {t: 0.0 for t in TIERS}
-cust["Entry"] = float(cohort)
+@st.cache_resource
+def scenario_store():
+    # Set ECOSYSTEM_CACHE_DIR to keep results on disk across restarts
+    return ScenarioStore(disk_dir=os.environ.get("ECOSYSTEM_CACHE_DIR") or None)
 
-flow_matrix = (
-    flows.groupby(["source_tier", "target_tier"])["prob"]
-    .sum()
-    .clip(upper=1.0)
-    .reset_index()
-)
 
-order = ["Entry", "Core", "Premium", "Upsell", "Recurring"]
-for src in order:
-    base = cust[src]
-    if base <= 0:
-        continue
-    outgoing = flow_matrix[flow_matrix["source_tier"] == src]
-    for _, row in outgoing.iterrows():
-        tgt = row["target_tier"]
-        cust[tgt] += base * row["prob"]
-
-rev = {}
-rev_margin = {}
-for _, row in tier_fin.iterrows():
-    tier = row["tier"]
-    customers = cust.get(tier, 0.0)
-    one_time_revenue = customers * row["avg_price"]
-    recurring_revenue = customers * row["avg_mrr"] * (
-        months
-        if tier != "Recurring"
-        else row["avg_term"]
-        if row["avg_term"] > 0
-        else months
+def solve_ecosystem(offers, flows, cohort, months):
+    model = offer_model(offers, flows)
+    return model, tier_table(model, cohort, months), offer_table(model, cohort, months)
+
+
+# Results are keyed by the inputs the model reads, so display-only edits never re-solve
+scenario_key = input_hash(offers, flows, float(cohort), float(months))
+try:
+    model, rev_df, offer_df = scenario_store().get_or_compute(
+        scenario_key, lambda: solve_ecosystem(offers, flows, cohort, months)
+    )
+except ValueError as e:
+    st.error(f"Flow model error: {e}")
+    st.stop()
+
+with st.sidebar:
+    store_stats = scenario_store().stats()
+    st.caption(
+        f"Scenario cache: {store_stats['entries']} results · {store_stats['hits']} hits / "
+        f"{store_stats['misses']} computed"
     )
-    total_rev = one_time_revenue + recurring_revenue
-    rev[tier] = total_rev
-    rev_margin[tier] = total_rev * row["avg_margin"]
-
-rev_df = pd.DataFrame({
-    "tier": TIERS,
-    "expected_customers": [cust[t] for t in TIERS],
-    "revenue": [rev[t] for t in TIERS],
-    "contribution": [rev_margin[t] for t in TIERS],
-    "avg_margin_pct": [
-        tier_fin[tier_fin["tier"] == t]["avg_margin"].values[0]
-        if t in tier_fin["tier"].values
-        else 0
-        for t in TIERS
-    ],
-})
 
 # -----------------------
 # Branded Offer Ecosystem Map (Sankey)
@@ -420,22 +469,15 @@ rev_df = pd.DataFrame({
 st.markdown("---")
 st.subheader("Offer Ecosystem Map (Branded Flow)")
 
-links = flows.copy()
-links = links.merge(
-    pd.DataFrame(
-        {"tier": list(cust.keys()), "expected_customers": list(cust.values())}
-    ),
-    left_on="source_tier",
-    right_on="tier",
-    how="left",
-)
-links["value"] = (links["prob"] * links["expected_customers"]).round(2)
+SANKEY_MAX_BYTES = 100_000
+
+sk1, sk2, sk3 = st.columns(3)
+sankey_level = sk1.radio("Nodes", ["Tiers", "Offers"], horizontal=True)
+sankey_top_k = sk2.slider("Links shown (largest first)", 5, 300, 40, 5)
+sankey_min_share = sk3.slider("Hide links below (% of total flow)", 0.0, 5.0, 0.0, 0.1) / 100.0
 
-labels = TIERS
-lab_to_idx = {lab: i for i, lab in enumerate(labels)}
-source_idx = links["source_tier"].map(lab_to_idx).tolist()
-target_idx = links["target_tier"].map(lab_to_idx).tolist()
-values = links["value"].tolist()
+visits = offer_df["expected_customers"].to_numpy()
+all_links = state_links(model, visits) if sankey_level == "Offers" else tier_links(model, visits)
 
 # Brand node colours
 node_colors = {
@@ -445,33 +487,71 @@ node_colors = {
     "Upsell":    "#fd7232",  # orange
     "Recurring": "#8B5CF6",  # purple
 }
-node_color_list = [node_colors.get(t, "#999999") for t in labels]
-
-sankey_fig = go.Figure(
-    data=[
-        go.Sankey(
-            arrangement="snap",
-            node=dict(
-                label=labels,
-                pad=25,
-                thickness=20,
-                color=node_color_list,
-            ),
-            link=dict(
-                source=source_idx,
-                target=target_idx,
-                value=values,
-                label=links["label"],
-                color="rgba(255,255,255,0.35)",
-            ),
-        )
-    ]
-)
-sankey_fig.update_layout(
-    title_text="Tier-to-Tier Movement (Expected Customers)",
-    font=dict(family="Inter", size=12, color="#ffffff"),
-    paper_bgcolor="rgba(0,0,0,0)",
-    plot_bgcolor="rgba(0,0,0,0)",
+
+
+def sankey_figure(links):
+    # Nodes are clustered into one column per tier, in tier order, coloured by tier
+    ends = pd.concat([
+        links[["source", "source_tier"]].set_axis(["node", "tier"], axis=1),
+        links[["target", "target_tier"]].set_axis(["node", "tier"], axis=1),
+    ]).drop_duplicates("node")
+    tier_pos = {t: i for i, t in enumerate(model.tiers)}
+    ends["col"] = ends["tier"].map(tier_pos)
+    ends["is_other"] = ends["node"].str.startswith("Other · ")
+    ends = ends.sort_values(["col", "is_other", "node"]).reset_index(drop=True)
+    cols = sorted(ends["col"].unique())
+    ends["x"] = ends["col"].map({c: 0.01 + 0.98 * i / max(len(cols) - 1, 1) for i, c in enumerate(cols)})
+    rank = ends.groupby("col").cumcount()
+    size = ends.groupby("col")["node"].transform("size")
+    ends["y"] = 0.01 + 0.98 * (rank + 0.5) / size
+    idx = {n: i for i, n in enumerate(ends["node"])}
+
+    fig = go.Figure(
+        data=[
+            go.Sankey(
+                arrangement="snap",
+                node=dict(
+                    label=ends["node"].tolist(),
+                    x=ends["x"].round(3).tolist(),
+                    y=ends["y"].round(3).tolist(),
+                    pad=25 if sankey_level == "Tiers" else 8,
+                    thickness=20,
+                    color=[node_colors.get(t, "#999999") for t in ends["tier"]],
+                ),
+                link=dict(
+                    source=links["source"].map(idx).tolist(),
+                    target=links["target"].map(idx).tolist(),
+                    value=links["value"].round(2).tolist(),
+                    color=np.where(links["other"], "rgba(255,255,255,0.15)", "rgba(255,255,255,0.35)").tolist(),
+                ),
+            )
+        ]
+    )
+    fig.update_layout(
+        title_text="Tier-to-Tier Movement (Expected Customers)" if sankey_level == "Tiers"
+        else "Offer-to-Offer Movement (Expected Customers)",
+        font=dict(family="Inter", size=12, color="#ffffff"),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        height=450 if sankey_level == "Tiers" else max(450, min(1200, 18 * len(ends))),
+    )
+    return fig
+
+
+# Halve the link budget until the serialised figure fits the payload cap
+k = sankey_top_k
+while True:
+    links = condense_links(all_links, k, sankey_min_share)
+    sankey_fig = sankey_figure(links)
+    if len(sankey_fig.to_json()) <= SANKEY_MAX_BYTES or k <= 5:
+        break
+    k = max(5, k // 2)
+
+shown = int((~links["other"]).sum())
+st.caption(
+    f"Showing {shown} of {len(all_links):,} links"
+    + (f" (reduced from {sankey_top_k} to fit the chart size limit)" if k < sankey_top_k else "")
+    + ("; the rest are grouped into “Other · tier” nodes." if links["other"].any() else ".")
 )
 st.plotly_chart(sankey_fig, use_container_width=True)
 
@@ -541,6 +621,307 @@ with colB:
         pass
 
 st.dataframe(rev_df.round(2), use_container_width=True)
+with st.expander(f"Offer-level detail ({len(model.offers)} offers, {len(model.src):,} edges)"):
+    st.dataframe(offer_df.round(2), use_container_width=True, hide_index=True)
+
+# -----------------------
+# Monthly revenue timeline
+# -----------------------
+st.markdown("---")
+st.subheader("Monthly Revenue Timeline")
+st.caption(
+    "Each flow takes one month. Month 1 brings the Entry cohort; later months add the monthly "
+    "acquisition volume. Recurring subscribers churn at the monthly rate until their term ends."
+)
+
+acquisitions = np.full(horizon, float(monthly_new))
+acquisitions[0] = float(cohort)
+timeline = monthly_table(model, monthly_simulation(model, acquisitions, months, churn))
+
+fig_tl = px.area(
+    timeline,
+    x="month",
+    y="revenue",
+    color="tier",
+    title="Recognised Revenue by Month and Tier",
+    color_discrete_map=node_colors,
+)
+fig_tl.update_layout(
+    paper_bgcolor="rgba(0,0,0,0)",
+    plot_bgcolor="rgba(7,10,24,1)",
+    font_color="#ffffff",
+)
+st.plotly_chart(fig_tl, use_container_width=True)
+
+tl_total = timeline.groupby("month")[["revenue", "contribution"]].sum().reset_index()
+tl_total["cumulative_contribution"] = tl_total["contribution"].cumsum()
+fig_cum = px.line(
+    tl_total,
+    x="month",
+    y=["revenue", "contribution", "cumulative_contribution"],
+    title="Total Revenue, Contribution & Cumulative Contribution",
+)
+fig_cum.update_layout(
+    paper_bgcolor="rgba(0,0,0,0)",
+    plot_bgcolor="rgba(7,10,24,1)",
+    font_color="#ffffff",
+)
+st.plotly_chart(fig_cum, use_container_width=True)
+
+st.download_button(
+    "⬇️ Download monthly timeline (CSV)",
+    data=timeline.to_csv(index=False),
+    file_name="ecosystem_monthly_timeline.csv",
+    mime="text/csv",
+)
+
+# -----------------------
+# Monte Carlo
+# -----------------------
+st.markdown("---")
+st.subheader("Uncertainty Range (Monte Carlo)")
+st.caption(
+    "Flow probabilities and margins are drawn from Beta distributions centred on your inputs; "
+    "prices and MRR vary by a lognormal factor. Every scenario is solved through the same flow model."
+)
+
+run_mc = st.checkbox("Run Monte Carlo", value=False)
+if run_mc:
+    m1, m2, m3, m4, m5 = st.columns(5)
+    n_scen = m1.selectbox("Scenarios", [10_000, 50_000, 100_000], index=2)
+    mc_seed = m2.number_input("Seed", min_value=0, value=42, step=1)
+    prob_strength = m3.slider("Flow certainty (pseudo-customers)", 5, 500, 50, 5)
+    price_cv = m4.slider("Price variation (CV)", 0.0, 0.5, 0.10, 0.01)
+    margin_strength = m5.slider("Margin certainty", 5, 500, 100, 5)
+
+    mc_args = dict(
+        n_scenarios=int(n_scen),
+        seed=int(mc_seed),
+        prob_strength=float(prob_strength),
+        price_cv=float(price_cv),
+        margin_strength=float(margin_strength),
+    )
+    mc = scenario_store().get_or_compute(
+        f"{scenario_key}:mc:{sorted(mc_args.items())}", lambda: monte_carlo(model, cohort, months, **mc_args)
+    )
+    mc_table = percentile_table(model, mc)
+    dropped = int(np.isnan(mc["revenue"]).any(axis=1).sum())
+    if dropped:
+        st.warning(f"{dropped:,} scenarios drew a loop that never decays and were excluded.")
+    st.dataframe(mc_table.round(0), use_container_width=True, hide_index=True)
+
+    # Pre-bin on the server so the chart ships ~60 bars instead of every scenario
+    total_contrib = mc["contribution"].sum(axis=1)
+    counts, edges = np.histogram(total_contrib[np.isfinite(total_contrib)], bins=60)
+    hist_df = pd.DataFrame({"total_contribution": (edges[:-1] + edges[1:]) / 2, "scenarios": counts})
+    fig_mc = px.bar(hist_df, x="total_contribution", y="scenarios", title="Total Contribution across Scenarios")
+    for q in ("P10", "P50", "P90"):
+        val = mc_table.loc[(mc_table["tier"] == "Total") & (mc_table["metric"] == "contribution"), q].iloc[0]
+        fig_mc.add_vline(x=val, line_dash="dash", annotation_text=q)
+    fig_mc.update_layout(
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(7,10,24,1)",
+        font_color="#ffffff",
+        bargap=0.02,
+    )
+    st.plotly_chart(fig_mc, use_container_width=True)
+
+    st.download_button(
+        "⬇️ Download P10/P50/P90 table (CSV)",
+        data=mc_table.to_csv(index=False),
+        file_name="ecosystem_monte_carlo.csv",
+        mime="text/csv",
+    )
+
+# -----------------------
+# Sensitivity / tornado
+# -----------------------
+st.markdown("---")
+st.subheader("Driver Sensitivity (Tornado)")
+st.caption(
+    "Every offer's price, mrr, term_months and margin_pct and every flow probability is moved "
+    "by ± the swing below. All perturbations are evaluated together in one batch."
+)
+
+run_sens = st.checkbox("Run sensitivity analysis", value=False)
+if run_sens:
+    s1, s2, s3 = st.columns(3)
+    swing = s1.slider("Swing (±%)", 1, 50, 10, 1) / 100.0
+    top_k = s2.slider("Drivers shown", 5, 40, 12, 1)
+    n_base = s3.selectbox("Sobol base samples", [256, 1024, 4096], index=1)
+
+    oat = scenario_store().get_or_compute(
+        f"{scenario_key}:oat:{swing}", lambda: one_at_a_time(model, cohort, months, swing)
+    )
+    tor = oat.head(top_k).iloc[::-1]
+    fig_tor = go.Figure()
+    fig_tor.add_bar(
+        y=tor["driver"], x=tor["contribution_low"], orientation="h",
+        name=f"-{swing:.0%}", marker_color="#F2003C",
+    )
+    fig_tor.add_bar(
+        y=tor["driver"], x=tor["contribution_high"], orientation="h",
+        name=f"+{swing:.0%}", marker_color="#00E4AB",
+    )
+    fig_tor.update_layout(
+        barmode="overlay",
+        title="Change in Total Contribution vs Base",
+        xaxis_title="Δ contribution",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(7,10,24,1)",
+        font_color="#ffffff",
+        height=max(360, 28 * len(tor)),
+    )
+    st.plotly_chart(fig_tor, use_container_width=True)
+
+    sobol = scenario_store().get_or_compute(
+        f"{scenario_key}:sobol:{swing}:{n_base}", lambda: sobol_indices(model, cohort, months, swing, n_base=int(n_base))
+    )
+    st.markdown("**Sobol indices** (share of contribution variance; S1 = driver alone, ST = including interactions)")
+    st.dataframe(sobol.head(top_k).round(3), use_container_width=True, hide_index=True)
+    st.download_button(
+        "⬇️ Download sensitivity table (CSV)",
+        data=oat.merge(sobol[["driver", "S1", "ST"]], on="driver", how="left").to_csv(index=False),
+        file_name="ecosystem_sensitivity.csv",
+        mime="text/csv",
+    )
+
+# -----------------------
+# Price & conversion optimizer
+# -----------------------
+st.markdown("---")
+st.subheader("Price & Conversion Optimizer")
+st.caption(
+    "Searches one price multiplier per tier (applied to price and MRR of its offers) to maximise "
+    "contribution, keeping Entry < Core < Premium and, optionally, a cap on the jump between them."
+)
+
+run_opt = st.checkbox("Run optimizer", value=False)
+if run_opt:
+    o1, o2, o3 = st.columns(3)
+    mult_range = o1.slider("Price multiplier range", 0.25, 4.0, (0.5, 2.0), 0.05)
+    max_jump = o2.number_input("Max price jump between tiers (×, 0 = off)", min_value=0.0, value=0.0, step=0.5)
+    conv_swing = o3.slider("Search conversion targets (±%)", 0, 50, 0, 5) / 100.0
+
+    opt_tiers = list(dict.fromkeys(model.offer_tiers))
+    st.caption("Price elasticity per tier: conversion into the tier scales by multiplier^(−elasticity). 0 = price-insensitive.")
+    elas_df = st.data_editor(
+        pd.DataFrame({"tier": opt_tiers, "elasticity": [0.0] * len(opt_tiers)}),
+        use_container_width=True,
+        hide_index=True,
+        disabled=["tier"],
+        key="opt_elasticity",
+    )
+
+    opt_args = dict(
+        bounds=tuple(mult_range),
+        elasticity=dict(zip(elas_df["tier"], pd.to_numeric(elas_df["elasticity"], errors="coerce").fillna(0.0))),
+        max_jump=max_jump or None,
+        conversion_swing=conv_swing,
+    )
+    opt = scenario_store().get_or_compute(
+        f"{scenario_key}:opt:{sorted(opt_args.items())}", lambda: optimize_prices(model, cohort, months, **opt_args)
+    )
+    cand, front, best = opt["candidates"], opt["frontier"], opt["best"]
+    n_looping = int(cand["looping"].sum())
+    st.caption(
+        f"{int(cand['feasible'].sum()):,} of {len(cand):,} candidates feasible · "
+        f"{n_looping:,} drew a loop that never decays · "
+        f"{len(cand) - n_looping - int(cand['feasible'].sum()):,} broke the price constraints"
+    )
+    if best is None:
+        st.warning("No candidate satisfies the price constraints. Widen the multiplier range or relax the jump cap.")
+    else:
+        base_row = cand.iloc[0]
+        k1, k2 = st.columns(2)
+        k1.metric("Best contribution", f"{best['contribution']:,.0f}", f"{best['contribution'] - base_row['contribution']:,.0f} vs current")
+        k2.metric("Revenue at best", f"{best['revenue']:,.0f}", f"{best['revenue'] - base_row['revenue']:,.0f} vs current")
+        st.dataframe(
+            pd.DataFrame({
+                "tier": opt["tiers"],
+                "current_avg_price": [base_row[f"price_{t}"] for t in opt["tiers"]],
+                "suggested_avg_price": [best[f"price_{t}"] for t in opt["tiers"]],
+                "multiplier": [best[f"mult_{t}"] for t in opt["tiers"]],
+            }).round(2),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        # Plot a sample of feasible candidates plus the full frontier to keep the payload small
+        feas = cand[cand["feasible"]]
+        fig_opt = px.scatter(
+            feas.sample(min(len(feas), 2000), random_state=0),
+            x="revenue",
+            y="contribution",
+            opacity=0.35,
+            title="Candidates and Revenue–Contribution Frontier",
+        )
+        fig_opt.add_scatter(x=front["revenue"], y=front["contribution"], mode="lines+markers", name="Pareto frontier",
+                            line=dict(color="#00E4AB"))
+        fig_opt.update_layout(
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(7,10,24,1)",
+            font_color="#ffffff",
+        )
+        st.plotly_chart(fig_opt, use_container_width=True)
+        st.download_button(
+            "⬇️ Download Pareto frontier (CSV)",
+            data=front.to_csv(index=False),
+            file_name="ecosystem_price_frontier.csv",
+            mime="text/csv",
+        )
+
+# -----------------------
+# Named scenarios
+# -----------------------
+st.markdown("---")
+st.subheader("Scenario Comparison")
+st.caption(
+    "Save the current assumptions under a name, then compare saved scenarios side by side. "
+    "Saved results are kept with the scenario, so comparing never recomputes."
+)
+
+if "eco_scenarios" not in st.session_state:
+    st.session_state.eco_scenarios = {}
+
+sc1, sc2 = st.columns([3, 1])
+scenario_name = sc1.text_input("Scenario name", value=f"Scenario {len(st.session_state.eco_scenarios) + 1}")
+if sc2.button("Save scenario") and scenario_name.strip():
+    st.session_state.eco_scenarios[scenario_name.strip()] = {"key": scenario_key, "rev_df": rev_df}
+
+saved = st.session_state.eco_scenarios
+if saved:
+    compare = st.multiselect("Compare", list(saved), default=list(saved)[-3:])
+    if compare:
+        comp = pd.concat(
+            [saved[name]["rev_df"].assign(scenario=name) for name in compare], ignore_index=True
+        )
+        totals = comp.groupby("scenario", sort=False)[["expected_customers", "revenue", "contribution"]].sum()
+        totals = totals.reindex(compare)
+        totals["vs_first_contribution"] = totals["contribution"] - totals["contribution"].iloc[0]
+        st.dataframe(totals.round(0), use_container_width=True)
+
+        wide = comp.pivot_table(
+            index="tier", columns="scenario", values=["revenue", "contribution"], sort=False
+        ).reindex(columns=compare, level=1)
+        st.dataframe(wide.round(0), use_container_width=True)
+
+        fig_sc = px.bar(
+            comp, x="tier", y="contribution", color="scenario", barmode="group",
+            title="Contribution by Tier and Scenario",
+        )
+        fig_sc.update_layout(
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(7,10,24,1)",
+            font_color="#ffffff",
+        )
+        st.plotly_chart(fig_sc, use_container_width=True)
+        st.download_button(
+            "⬇️ Download scenario comparison (CSV)",
+            data=comp.to_csv(index=False),
+            file_name="ecosystem_scenarios.csv",
+            mime="text/csv",
+        )
 
 # -----------------------
 # Psychology table
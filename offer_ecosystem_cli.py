@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import argparse, os, sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from offer_ecosystem_engine import clean_flows, clean_offers, offer_model, tier_table
+
+
+def find_runs(root):
+    """Every folder under `root` holding an offers.csv/flows.csv pair; the folder path names the scenario."""
+    runs = []
+    for dirpath, dirnames, files in os.walk(root):
+        dirnames.sort()
+        if "offers.csv" in files and "flows.csv" in files:
+            name = os.path.relpath(dirpath, root)
+            runs.append((os.path.basename(os.path.abspath(root)) if name == "." else name,
+                         os.path.join(dirpath, "offers.csv"), os.path.join(dirpath, "flows.csv")))
+    return runs
+
+
+def read_manifest(path):
+    """Manifest CSV with scenario, offers, flows and optional cohort/months columns; paths are relative to it."""
+    man = pd.read_csv(path)
+    miss = [c for c in ["scenario", "offers", "flows"] if c not in man.columns]
+    if miss:
+        sys.exit(f"{path} is missing columns: {', '.join(miss)}")
+    base = os.path.dirname(os.path.abspath(path))
+    for c in ["offers", "flows"]:
+        man[c] = [p if os.path.isabs(p) else os.path.join(base, p) for p in man[c].astype(str)]
+    return man
+
+
+def run_one(job):
+    scenario, offers_path, flows_path, cohort, months = job
+    try:
+        offers = pd.read_csv(offers_path)
+        if "enabled" not in offers.columns:
+            offers["enabled"] = True
+        model = offer_model(clean_offers(offers), clean_flows(pd.read_csv(flows_path)))
+        rev = tier_table(model, cohort, months)
+        rev.insert(0, "scenario", scenario)
+        rev["cohort"] = cohort
+        rev["months"] = months
+        return scenario, rev, None
+    except Exception as e:
+        return scenario, None, f"{type(e).__name__}: {e}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Batch-evaluate offer ecosystems (offers.csv + flows.csv pairs).")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--input", help="folder searched recursively for offers.csv/flows.csv pairs")
+    src.add_argument("--manifest", help="CSV with scenario, offers, flows[, cohort, months] columns")
+    ap.add_argument("--cohort", type=float, default=1000.0, help="Entry cohort size (default 1000)")
+    ap.add_argument("--months", type=float, default=12.0, help="recurring term for MRR when term_months is 0 (default 12)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (1 = run inline)")
+    ap.add_argument("--out", default="output/ecosystem_tiers.parquet")
+    args = ap.parse_args()
+
+    if args.input:
+        jobs = [(name, o, f, args.cohort, args.months) for name, o, f in find_runs(args.input)]
+    else:
+        man = read_manifest(args.manifest)
+        cohort = pd.to_numeric(man.get("cohort", args.cohort), errors="coerce")
+        months = pd.to_numeric(man.get("months", args.months), errors="coerce")
+        man["cohort"] = pd.Series(cohort, index=man.index).fillna(args.cohort)
+        man["months"] = pd.Series(months, index=man.index).fillna(args.months)
+        jobs = list(man[["scenario", "offers", "flows", "cohort", "months"]].itertuples(index=False, name=None))
+    if not jobs:
+        sys.exit("No offers.csv/flows.csv pairs found.")
+
+    workers = max(1, min(args.workers or 1, len(jobs)))
+    if workers == 1:
+        results = [run_one(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_one, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    frames = [rev for _, rev, _ in results if rev is not None]
+    errors = [(name, err) for name, _, err in results if err is not None]
+    if frames:
+        pd.concat(frames, ignore_index=True).to_parquet(args.out, index=False)
+    if errors:
+        err_path = os.path.splitext(args.out)[0] + "_errors.csv"
+        pd.DataFrame(errors, columns=["scenario", "error"]).to_csv(err_path, index=False)
+        print(f"{len(errors)} scenario(s) failed; see {err_path}", file=sys.stderr)
+
+    print(f"Done. {len(frames)} of {len(jobs)} scenarios saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,677 @@
+# Offer Ecosystem engine – offer-level graph economics with customer movement solved as an absorbing Markov chain
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+TIERS = ["Entry", "Core", "Premium", "Upsell", "Recurring"]
+OFFER_VALUE_COLS = ["price", "mrr", "term_months", "margin_pct"]
+BATCH_BYTES = 256 * 1024 ** 2
+MODEL_OFFER_COLS = ["offer", "tier"] + OFFER_VALUE_COLS
+MODEL_FLOW_COLS = ["source_tier", "target_tier", "label", "prob"]
+
+
+# ---------- Cleaning ----------
+def clean_offers(offers: pd.DataFrame) -> pd.DataFrame:
+    offers = offers.copy()
+    offers["enabled"] = offers["enabled"].astype(bool)
+    offers = offers[offers["enabled"]].copy()
+    offers["offer"] = offers["offer"].fillna("").astype(str).str.strip()
+    offers["tier"] = offers["tier"].fillna("").astype(str).str.strip()
+    for c in OFFER_VALUE_COLS:
+        offers[c] = pd.to_numeric(offers[c], errors="coerce").fillna(0.0)
+    return offers
+
+
+def clean_flows(flows: pd.DataFrame) -> pd.DataFrame:
+    """Flows whose endpoints name an offer or a tier; rows with a blank endpoint are dropped."""
+    flows = flows.copy()
+    flows["prob"] = pd.to_numeric(flows["prob"], errors="coerce").fillna(0.0)
+    for c in ("source_tier", "target_tier"):
+        flows[c] = flows[c].fillna("").astype(str).str.strip()
+    return flows[(flows["source_tier"] != "") & (flows["target_tier"] != "")]
+
+
+def input_hash(offers: pd.DataFrame, flows: pd.DataFrame, *params) -> str:
+    """Key for results computed from cleaned offers/flows plus `params` (cohort, months, …).
+
+    Only the columns the model reads are hashed, so edits to notes, positioning_frame or the
+    anchor/scarcity flags do not invalidate anything.
+    """
+    h = hashlib.sha256()
+    for frame, cols in ((offers, MODEL_OFFER_COLS), (flows, MODEL_FLOW_COLS)):
+        h.update(pd.util.hash_pandas_object(frame.reindex(columns=cols), index=False).to_numpy().tobytes())
+        h.update(b"|")
+    h.update(repr(params).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+# ---------- Markov chain ----------
+def transition_matrix(src: np.ndarray, tgt: np.ndarray, prob: np.ndarray, n: int) -> np.ndarray:
+    """Dense n×n transition matrix from edge arrays; `prob` may carry leading batch dimensions."""
+    prob = np.asarray(prob, dtype=float)
+    batch = prob.shape[:-1]
+    flat = np.asarray(src) * n + np.asarray(tgt)
+    P = np.zeros((int(np.prod(batch, dtype=int)), n * n))
+    if len(flat):
+        # Parallel edges add up, then each cell is capped at 1 (same as groupby-sum-clip on the flows table)
+        order = np.argsort(flat, kind="stable")
+        cells, first = np.unique(flat[order], return_index=True)
+        summed = np.add.reduceat(prob.reshape(-1, len(flat))[:, order], first, axis=1)
+        P[:, cells] = np.minimum(summed, 1.0)
+    return P.reshape(batch + (n, n))
+
+
+def _solve_each(A: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # A batch solve fails as a whole on one singular member; solve the regular ones together and
+    # leave only the singular ones (a loop that never decays) at inf
+    n = A.shape[-1]
+    flat_A, flat_b = A.reshape(-1, n, n), b.reshape(-1, n, 1)
+    visits = np.full((len(flat_A), n), np.inf)
+    sign, _ = np.linalg.slogdet(flat_A)
+    regular = np.flatnonzero(sign != 0)
+    try:
+        visits[regular] = np.linalg.solve(flat_A[regular], flat_b[regular])[..., 0]
+    except np.linalg.LinAlgError:
+        for i in regular:
+            try:
+                visits[i] = np.linalg.solve(flat_A[i], flat_b[i])[:, 0]
+            except np.linalg.LinAlgError:
+                pass
+    return visits.reshape(b.shape[:-1])
+
+
+def expected_visits(P: np.ndarray, start: np.ndarray, strict: bool = True) -> np.ndarray:
+    """Expected arrivals per state, start · (I − P)⁻¹, for one matrix or a batch of them.
+
+    This is the fundamental-matrix row of the chain, so loops (e.g. Recurring → Core)
+    are counted exactly rather than cut off by a fixed processing order. Loops that never
+    decay raise ValueError, or with strict=False come back as NaN rows.
+    """
+    n = P.shape[-1]
+    A = np.eye(n) - np.swapaxes(P, -1, -2)
+    b = np.broadcast_to(np.asarray(start, dtype=float), P.shape[:-1])[..., None]
+    try:
+        visits = np.linalg.solve(A, b)[..., 0]
+    except np.linalg.LinAlgError:
+        visits = _solve_each(A, b)
+    tol = -1e-9 * max(1.0, float(np.abs(start).max()))
+    bad = ~(np.isfinite(visits) & (visits >= tol)).all(axis=-1)
+    if bad.any():
+        if strict:
+            raise ValueError(
+                "Flow probabilities around a loop add up to 100% or more, so customers never leave it. "
+                "Lower at least one probability in the loop."
+            )
+        visits = np.where(bad[..., None], np.nan, visits)
+    return np.maximum(visits, 0.0)
+
+
+# ---------- Economics ----------
+def state_economics(visits, price, mrr, term, margin, recurring, months):
+    """Revenue and contribution per state; every argument broadcasts, so batches work unchanged."""
+    recurring_months = np.where(recurring, np.where(term > 0, term, months), months)
+    revenue = visits * (price + mrr * recurring_months)
+    return revenue, revenue * margin
+
+
+@dataclass(frozen=True)
+class EcosystemModel:
+    """Offer-level directed graph in index form: one state per offer, tier as an attribute.
+
+    Tiers without offers get a placeholder state so flows can still pass through them.
+    `prob` holds one probability per input flow row; `edge_flow`/`edge_scale` expand those
+    rows onto the state edges `src → tgt`, so drivers stay per flow row even when a
+    tier-level flow fans out over many offers. Offer-level economics (price, mrr,
+    term_months, margin_pct per offer) can be perturbed in batches without rebuilding.
+    """
+
+    states: list
+    state_tiers: list
+    state_offer: np.ndarray
+    tiers: list
+    tier_index: np.ndarray
+    src: np.ndarray
+    tgt: np.ndarray
+    edge_flow: np.ndarray
+    edge_scale: np.ndarray
+    prob: np.ndarray
+    flow_names: list
+    flow_target_tiers: list
+    offers: list
+    offer_tiers: list
+    offer_values: np.ndarray
+    recurring: np.ndarray
+    entry: np.ndarray
+
+    @property
+    def n(self) -> int:
+        return len(self.states)
+
+    def values_for(self, offer_values: np.ndarray) -> np.ndarray:
+        """Per-state (price, mrr, term, margin) from offer values, keeping any batch dimensions."""
+        vals = np.take(offer_values, np.maximum(self.state_offer, 0), axis=-2)
+        return np.where((self.state_offer >= 0)[:, None], vals, 0.0)
+
+    @property
+    def state_values(self) -> np.ndarray:
+        return self.values_for(self.offer_values)
+
+    @property
+    def price(self) -> np.ndarray:
+        return self.state_values[:, 0]
+
+    @property
+    def mrr(self) -> np.ndarray:
+        return self.state_values[:, 1]
+
+    @property
+    def term(self) -> np.ndarray:
+        return self.state_values[:, 2]
+
+    @property
+    def margin(self) -> np.ndarray:
+        return self.state_values[:, 3]
+
+    def edge_prob(self, prob: np.ndarray | None = None) -> np.ndarray:
+        prob = self.prob if prob is None else np.asarray(prob, dtype=float)
+        return prob[..., self.edge_flow] * self.edge_scale
+
+    def transition(self, prob: np.ndarray | None = None) -> np.ndarray:
+        return transition_matrix(self.src, self.tgt, self.edge_prob(prob), self.n)
+
+    def by_tier(self, values: np.ndarray) -> np.ndarray:
+        """Sum the trailing state axis into tiers (display order of `tiers`)."""
+        onehot = np.zeros((self.n, len(self.tiers)))
+        onehot[np.arange(self.n), self.tier_index] = 1.0
+        return values @ onehot
+
+
+def _flow_names(flows: pd.DataFrame) -> list:
+    names = flows["source_tier"].astype(str) + "→" + flows["target_tier"].astype(str)
+    if "label" in flows.columns:
+        label = flows["label"].fillna("").astype(str).str.strip()
+        names = names.where(label == "", names + " (" + label + ")")
+    return names.tolist()
+
+
+def offer_model(offers: pd.DataFrame, flows: pd.DataFrame) -> EcosystemModel:
+    """Build the offer graph from cleaned offers and flows.
+
+    A flow endpoint is an offer name or a tier label (offer names win on a clash). A tier
+    endpoint expands to every state in that tier: as a source each of them moves with the
+    flow's probability, as a target the probability is split evenly between them. Endpoints
+    that match neither become a placeholder tier. The Entry cohort is split evenly across
+    the Entry states.
+    """
+    offer_names = offers["offer"].astype(str).to_numpy()
+    offer_tiers = offers["tier"].astype(str).to_numpy()
+    endpoints = pd.unique(pd.concat([flows["source_tier"], flows["target_tier"]]).astype(str))
+    name_set = set(offer_names)
+    seen = list(dict.fromkeys(list(offer_tiers) + [e for e in endpoints if e not in name_set]))
+    tiers = list(TIERS) + [t for t in seen if t not in TIERS]
+    empty = [t for t in tiers if t not in set(offer_tiers)]
+
+    states = list(offer_names) + empty
+    state_tiers = np.array(list(offer_tiers) + empty, dtype=object)
+    state_offer = np.r_[np.arange(len(offers)), np.full(len(empty), -1)].astype(int)
+    tier_pos = {t: i for i, t in enumerate(tiers)}
+    tier_index = np.array([tier_pos[t] for t in state_tiers], dtype=int)
+
+    # Endpoint label -> member states, as CSR arrays (offer names first so they win over tiers)
+    groups = pd.Series(np.arange(len(states))).groupby(state_tiers).indices
+    groups.update(pd.Series(np.arange(len(offers))).groupby(offer_names).indices)
+    labels = list(groups)
+    label_pos = {g: i for i, g in enumerate(labels)}
+    size = np.array([len(groups[g]) for g in labels], dtype=int)
+    indptr = np.r_[0, np.cumsum(size)]
+    members = np.concatenate([groups[g] for g in labels]) if labels else np.zeros(0, dtype=int)
+
+    sg = flows["source_tier"].astype(str).map(label_pos).to_numpy(dtype=int)
+    tg = flows["target_tier"].astype(str).map(label_pos).to_numpy(dtype=int)
+    ns, nt = size[sg], size[tg]
+    per_flow = ns * nt
+    edge_flow = np.repeat(np.arange(len(flows)), per_flow)
+    k = np.arange(per_flow.sum()) - np.repeat(np.cumsum(per_flow) - per_flow, per_flow)
+    src = members[indptr[sg][edge_flow] + k // nt[edge_flow]]
+    tgt = members[indptr[tg][edge_flow] + k % nt[edge_flow]]
+
+    entry = (state_tiers == "Entry").astype(float)
+    entry /= max(entry.sum(), 1.0)
+    return EcosystemModel(
+        states=states,
+        state_tiers=list(state_tiers),
+        state_offer=state_offer,
+        tiers=tiers,
+        tier_index=tier_index,
+        src=src,
+        tgt=tgt,
+        edge_flow=edge_flow,
+        edge_scale=1.0 / nt[edge_flow],
+        prob=flows["prob"].to_numpy(dtype=float),
+        flow_names=_flow_names(flows),
+        flow_target_tiers=list(state_tiers[members[indptr[tg]]]),
+        offers=list(offer_names),
+        offer_tiers=list(offer_tiers),
+        offer_values=offers[OFFER_VALUE_COLS].to_numpy(dtype=float),
+        recurring=state_tiers == "Recurring",
+        entry=entry,
+    )
+
+
+def _batch_rows(model: EcosystemModel) -> int:
+    # Scenarios per solve so the stacked n×n transition matrices stay within BATCH_BYTES
+    return max(1, BATCH_BYTES // (8 * model.n * model.n))
+
+
+def evaluate(
+    model: EcosystemModel,
+    cohort: float,
+    months: float,
+    offer_values: np.ndarray | None = None,
+    prob: np.ndarray | None = None,
+    strict: bool = True,
+):
+    """(visits, revenue, contribution) per state; `offer_values`/`prob` may carry batch dimensions."""
+    offer_values = model.offer_values if offer_values is None else np.asarray(offer_values, dtype=float)
+    prob = model.prob if prob is None else np.asarray(prob, dtype=float)
+    batch = np.broadcast_shapes(offer_values.shape[:-2], prob.shape[:-1])
+    step = _batch_rows(model)
+    if len(batch) == 1 and batch[0] > step:
+        offer_values = np.broadcast_to(offer_values, batch + offer_values.shape[-2:])
+        prob = np.broadcast_to(prob, batch + prob.shape[-1:])
+        parts = []
+        for lo in range(0, batch[0], step):
+            v, r, c = evaluate(model, cohort, months, offer_values[lo:lo + step], prob[lo:lo + step], strict)
+            parts.append((np.broadcast_to(v, r.shape), r, c))
+        return tuple(np.concatenate(p) for p in zip(*parts))
+
+    sv = model.values_for(offer_values)
+    visits = expected_visits(model.transition(prob), float(cohort) * model.entry, strict=strict)
+    revenue, contribution = state_economics(
+        visits, sv[..., 0], sv[..., 1], sv[..., 2], sv[..., 3], model.recurring, months
+    )
+    return visits, revenue, contribution
+
+
+def offer_table(model: EcosystemModel, cohort: float, months: float) -> pd.DataFrame:
+    """Per-state (offer or empty-tier placeholder) expected customers, revenue and contribution."""
+    visits, revenue, contribution = evaluate(model, cohort, months)
+    return pd.DataFrame({
+        "offer": model.states,
+        "tier": model.state_tiers,
+        "expected_customers": visits,
+        "revenue": revenue,
+        "contribution": contribution,
+        "margin_pct": model.margin,
+    })
+
+
+def tier_table(model: EcosystemModel, cohort: float, months: float) -> pd.DataFrame:
+    """Offer results summed to tiers; avg_margin_pct is the plain mean over the tier's offers."""
+    visits, revenue, contribution = evaluate(model, cohort, months)
+    offer_t = model.tier_index[model.state_offer >= 0]
+    counts = np.bincount(offer_t, minlength=len(model.tiers))
+    margins = np.bincount(offer_t, weights=model.offer_values[:, 3], minlength=len(model.tiers))
+    return pd.DataFrame({
+        "tier": model.tiers,
+        "expected_customers": model.by_tier(visits),
+        "revenue": model.by_tier(revenue),
+        "contribution": model.by_tier(contribution),
+        "avg_margin_pct": margins / np.maximum(counts, 1),
+    })
+
+
+def tier_links(model: EcosystemModel, visits: np.ndarray) -> pd.DataFrame:
+    """Expected customers moving between tiers: edge flows summed per (source tier, target tier)."""
+    T = len(model.tiers)
+    cell = model.tier_index[model.src] * T + model.tier_index[model.tgt]
+    moved = np.bincount(cell, weights=visits[model.src] * model.edge_prob(), minlength=T * T)
+    nz = np.flatnonzero(moved > 0)
+    tiers = np.array(model.tiers, dtype=object)
+    return pd.DataFrame({
+        "source": tiers[nz // T],
+        "target": tiers[nz % T],
+        "source_tier": tiers[nz // T],
+        "target_tier": tiers[nz % T],
+        "value": moved[nz],
+    })
+
+
+def state_links(model: EcosystemModel, visits: np.ndarray) -> pd.DataFrame:
+    """Expected customers moving between offers, with parallel edges merged into one link per pair."""
+    n = model.n
+    cell = model.src * n + model.tgt
+    cells, inverse = np.unique(cell, return_inverse=True)
+    moved = np.bincount(inverse, weights=visits[model.src] * model.edge_prob(), minlength=len(cells))
+    keep = moved > 0
+    src, tgt = cells[keep] // n, cells[keep] % n
+    states = np.array(model.states, dtype=object)
+    tiers = np.array(model.state_tiers, dtype=object)
+    return pd.DataFrame({
+        "source": states[src],
+        "target": states[tgt],
+        "source_tier": tiers[src],
+        "target_tier": tiers[tgt],
+        "value": moved[keep],
+    })
+
+
+def condense_links(links: pd.DataFrame, top_k: int, min_share: float = 0.0) -> pd.DataFrame:
+    """Keep the `top_k` largest links carrying at least `min_share` of the total flow.
+
+    Everything else is summed per tier pair between "Other · <tier>" nodes, so the total
+    flow shown is unchanged. Adds an `other` flag column.
+    """
+    links = links.sort_values("value", ascending=False, kind="stable").reset_index(drop=True)
+    keep = (links.index < top_k) & (links["value"] >= min_share * links["value"].sum())
+    rest = links[~keep]
+    if rest.empty:
+        return links.assign(other=False)
+    other = rest.groupby(["source_tier", "target_tier"], sort=False, as_index=False)["value"].sum()
+    other["source"] = "Other · " + other["source_tier"]
+    other["target"] = "Other · " + other["target_tier"]
+    return pd.concat([links[keep].assign(other=False), other.assign(other=True)], ignore_index=True)[
+        list(links.columns) + ["other"]
+    ]
+
+
+# ---------- Monthly cohort simulation ----------
+def _causal_conv(x: np.ndarray, kernel: np.ndarray, horizon: int) -> np.ndarray:
+    # Convolution along the month axis via FFT; replaces a loop over acquisition cohorts
+    L = 2 * horizon
+    out = np.fft.irfft(np.fft.rfft(x, L, axis=0) * np.fft.rfft(kernel, L, axis=0), L, axis=0)[:horizon]
+    return np.maximum(out, 0.0)
+
+
+def monthly_simulation(
+    model: EcosystemModel,
+    acquisitions: np.ndarray,
+    months: float,
+    churn: float = 0.0,
+) -> dict:
+    """Month-by-month arrivals, active subscribers, revenue and contribution per state.
+
+    Each flow takes one month: customers arriving in a state in month t reach its targets in
+    month t+1. `acquisitions[t]` new customers enter in month t; the horizon is its length.
+    Subscriptions bill `mrr` for the same number of months as the lump-sum model, and
+    `churn` (monthly) applies to recurring states only.
+    """
+    acquisitions = np.asarray(acquisitions, dtype=float)
+    horizon = len(acquisitions)
+    PT = model.transition().T
+    # Impulse response of one customer entering in month 0
+    impulse = np.zeros((horizon, model.n))
+    impulse[0] = model.entry
+    for t in range(1, horizon):
+        impulse[t] = PT @ impulse[t - 1]
+    arrivals = _causal_conv(acquisitions[:, None], impulse, horizon)
+
+    billing_months = np.where(model.recurring, np.where(model.term > 0, model.term, months), months)
+    k = np.arange(horizon)[:, None]
+    survival = np.clip(billing_months[None, :] - k, 0.0, 1.0)
+    survival = survival * np.where(model.recurring, 1.0 - churn, 1.0)[None, :] ** k
+    active = _causal_conv(arrivals, survival, horizon) * (model.mrr > 0)
+
+    revenue = arrivals * model.price + active * model.mrr
+    return {
+        "arrivals": arrivals,
+        "active": active,
+        "revenue": revenue,
+        "contribution": revenue * model.margin,
+    }
+
+
+def monthly_table(model: EcosystemModel, sim: dict) -> pd.DataFrame:
+    """Long month × tier table; states are summed to tiers."""
+    horizon = sim["revenue"].shape[0]
+    T = len(model.tiers)
+    return pd.DataFrame({
+        "month": np.repeat(np.arange(1, horizon + 1), T),
+        "tier": np.tile(model.tiers, horizon),
+        "new_customers": model.by_tier(sim["arrivals"]).ravel(),
+        "active_subscribers": model.by_tier(sim["active"]).ravel(),
+        "revenue": model.by_tier(sim["revenue"]).ravel(),
+        "contribution": model.by_tier(sim["contribution"]).ravel(),
+    })
+
+
+# ---------- Monte Carlo ----------
+def _beta_around(rng: np.random.Generator, mean: np.ndarray, strength: float, size: tuple) -> np.ndarray:
+    # Beta draws with the given mean and pseudo-count; means outside (0, 1), e.g. loss-leader margins, stay fixed
+    m = np.clip(mean, 1e-6, 1 - 1e-6)
+    draws = rng.beta(m * strength, (1 - m) * strength, size=size)
+    return np.where((mean > 0) & (mean < 1), draws, mean)
+
+
+def monte_carlo(
+    model: EcosystemModel,
+    cohort: float,
+    months: float,
+    n_scenarios: int = 100_000,
+    seed: int = 0,
+    prob_strength: float = 50.0,
+    price_cv: float = 0.10,
+    margin_strength: float = 100.0,
+    chunk: int = 25_000,
+) -> dict:
+    """Revenue and contribution per tier for `n_scenarios` draws, shape (n_scenarios, n_tiers).
+
+    Flow probabilities and margins are Beta-distributed around their inputs; price and MRR get a
+    mean-one lognormal multiplier per state. Each quantity has its own seeded stream, so changing
+    one assumption does not reshuffle the others.
+    """
+    rng_prob, rng_price, rng_margin = (np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(3))
+    sigma = np.sqrt(np.log1p(price_cv ** 2))
+    revenue = np.empty((n_scenarios, len(model.tiers)))
+    contribution = np.empty((n_scenarios, len(model.tiers)))
+    chunk = min(chunk, _batch_rows(model))
+    for lo in range(0, n_scenarios, chunk):
+        size = min(chunk, n_scenarios - lo)
+        prob = _beta_around(rng_prob, model.prob, prob_strength, (size, len(model.prob)))
+        price_mult = rng_price.lognormal(-0.5 * sigma ** 2, sigma, size=(size, model.n))
+        margin = _beta_around(rng_margin, model.margin, margin_strength, (size, model.n))
+        visits = expected_visits(model.transition(prob), float(cohort) * model.entry, strict=False)
+        rev, con = state_economics(
+            visits, model.price * price_mult, model.mrr * price_mult, model.term, margin, model.recurring, months
+        )
+        revenue[lo:lo + size] = model.by_tier(rev)
+        contribution[lo:lo + size] = model.by_tier(con)
+    return {"revenue": revenue, "contribution": contribution}
+
+
+def percentile_table(model: EcosystemModel, mc: dict, q=(10, 50, 90)) -> pd.DataFrame:
+    rows = []
+    for metric, values in mc.items():
+        per_tier = np.nanpercentile(values, q, axis=0)
+        total = np.nanpercentile(values.sum(axis=1), q)
+        for i, label in enumerate(list(model.tiers) + ["Total"]):
+            col = per_tier[:, i] if i < len(model.tiers) else total
+            rows.append({"tier": label, "metric": metric, **{f"P{p}": v for p, v in zip(q, col)}})
+    return pd.DataFrame(rows)
+
+
+# ---------- Sensitivity ----------
+def driver_table(model: EcosystemModel) -> pd.DataFrame:
+    """One row per driver in the order of the stacked driver vector: offer economics, then flow probabilities."""
+    rows = [
+        {"driver": f"{o} · {c}", "kind": c, "base": v}
+        for o, vals in zip(model.offers, model.offer_values)
+        for c, v in zip(OFFER_VALUE_COLS, vals)
+    ]
+    rows += [{"driver": f"{name} · prob", "kind": "prob", "base": p} for name, p in zip(model.flow_names, model.prob)]
+    return pd.DataFrame(rows, columns=["driver", "kind", "base"])
+
+
+def _driver_bounds(drivers: pd.DataFrame, swing: float) -> tuple[np.ndarray, np.ndarray]:
+    base = drivers["base"].to_numpy(dtype=float)
+    kind = drivers["kind"].to_numpy()
+    # Ordered so low <= high even for a negative base
+    low = np.minimum(base * (1 - swing), base * (1 + swing))
+    high = np.maximum(base * (1 - swing), base * (1 + swing))
+    prob, margin = kind == "prob", kind == "margin_pct"
+    # Probabilities stay in [0, 1]; margins may be negative (loss leaders) but not above 1; the rest stay >= 0
+    low = np.where(prob, np.clip(low, 0, 1), np.where(margin, np.minimum(low, 1), np.maximum(low, 0)))
+    high = np.where(prob, np.clip(high, 0, 1), np.where(margin, np.minimum(high, 1), high))
+    return low, high
+
+
+def total_contribution(model: EcosystemModel, X: np.ndarray, cohort: float, months: float, chunk: int = 50_000) -> np.ndarray:
+    """Total contribution for each row of a stacked driver matrix X (rows × drivers)."""
+    n_vals = model.offer_values.size
+    out = np.empty(len(X))
+    for lo in range(0, len(X), chunk):
+        block = X[lo:lo + chunk]
+        vals = block[:, :n_vals].reshape((len(block),) + model.offer_values.shape)
+        _, _, contribution = evaluate(model, cohort, months, vals, block[:, n_vals:], strict=False)
+        out[lo:lo + chunk] = contribution.sum(axis=-1)
+    return out
+
+
+def one_at_a_time(model: EcosystemModel, cohort: float, months: float, swing: float = 0.10) -> pd.DataFrame:
+    """Tornado data: move each driver to its low and high bound while holding the rest at base."""
+    drivers = driver_table(model)
+    base = drivers["base"].to_numpy(dtype=float)
+    low, high = _driver_bounds(drivers, swing)
+    d = len(base)
+    X = np.tile(base, (2 * d + 1, 1))
+    X[np.arange(d), np.arange(d)] = low
+    X[d + np.arange(d), np.arange(d)] = high
+    y = total_contribution(model, X, cohort, months)
+    out = drivers.assign(
+        low=low,
+        high=high,
+        contribution_low=y[:d] - y[-1],
+        contribution_high=y[d:2 * d] - y[-1],
+    )
+    out["swing"] = (out["contribution_high"] - out["contribution_low"]).abs()
+    return out.sort_values("swing", ascending=False).reset_index(drop=True)
+
+
+def sobol_indices(
+    model: EcosystemModel,
+    cohort: float,
+    months: float,
+    swing: float = 0.10,
+    n_base: int = 1024,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """First-order (Saltelli) and total (Jansen) Sobol indices with drivers uniform within ±swing.
+
+    All n_base × (drivers + 2) evaluations are stacked into one matrix and solved together.
+    """
+    drivers = driver_table(model)
+    low, high = _driver_bounds(drivers, swing)
+    d = len(drivers)
+    rng = np.random.default_rng(seed)
+    A = low + (high - low) * rng.random((n_base, d))
+    B = low + (high - low) * rng.random((n_base, d))
+    AB = np.repeat(A[None], d, axis=0)
+    AB[np.arange(d), :, np.arange(d)] = B[:, np.arange(d)].T
+    y = total_contribution(model, np.vstack([A, B, AB.reshape(-1, d)]), cohort, months)
+    fA, fB, fAB = y[:n_base], y[n_base:2 * n_base], y[2 * n_base:].reshape(d, n_base)
+    var = np.nanvar(np.concatenate([fA, fB]))
+    if not var > 0:
+        s1 = st = np.zeros(d)
+    else:
+        # Centring fB leaves the estimator unbiased and removes most of its variance when V ≪ mean²
+        s1 = np.nanmean((fB - np.nanmean(fB)) * (fAB - fA), axis=1) / var
+        st = 0.5 * np.nanmean((fA - fAB) ** 2, axis=1) / var
+    return drivers.assign(S1=s1, ST=st).sort_values("ST", ascending=False).reset_index(drop=True)
+
+
+# ---------- Price / conversion optimizer ----------
+def pareto_front(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Indices of points not dominated when maximising both x and y, sorted by x (O(n log n))."""
+    order = np.lexsort((-y, -x))
+    best = np.maximum.accumulate(y[order])
+    keep = np.r_[True, y[order][1:] > best[:-1]]
+    return order[keep][::-1]
+
+
+def optimize_prices(
+    model: EcosystemModel,
+    cohort: float,
+    months: float,
+    bounds: tuple = (0.5, 2.0),
+    elasticity: dict | None = None,
+    price_order: list | None = None,
+    max_jump: float | None = None,
+    conversion_swing: float = 0.0,
+    n_samples: int = 8_000,
+    rounds: int = 3,
+    seed: int = 0,
+) -> dict:
+    """Random search over one price multiplier per tier (applied to price and mrr of its offers).
+
+    Conversion into a tier scales by multiplier^(-elasticity). With `conversion_swing` > 0 every
+    flow probability is also searched within ±swing, giving target conversion rates. Candidates must
+    keep average tier prices in `price_order` strictly increasing and, when `max_jump` is set, each
+    step at most `max_jump`× the previous priced tier. Each round samples a batch around the best
+    feasible point so far, then shrinks the range.
+    """
+    elasticity = elasticity or {}
+    price_order = TIERS[:3] if price_order is None else price_order
+    tiers = list(dict.fromkeys(model.offer_tiers))
+    t_idx = {t: i for i, t in enumerate(tiers)}
+    offer_t = np.array([t_idx[t] for t in model.offer_tiers], dtype=int)
+    # Elasticity acts on flows into a tier; -1 marks targets in tiers without priced offers
+    flow_t = pd.Series(model.flow_target_tiers, dtype=object).map(t_idx).fillna(-1).to_numpy(dtype=int)
+    eps = np.array([float(elasticity.get(t, 0.0)) for t in tiers])
+    counts = np.bincount(offer_t, minlength=len(tiers))
+    ordered = [t_idx[t] for t in price_order if t in t_idx]
+
+    lo, hi = np.log(bounds[0]), np.log(bounds[1])
+    centre = np.zeros(len(tiers) + len(model.prob) * (conversion_swing > 0))
+    width = np.r_[np.full(len(tiers), hi - lo), np.full(len(centre) - len(tiers), 2 * conversion_swing)]
+    rng = np.random.default_rng(seed)
+    batches = []
+    for r in range(rounds):
+        U = centre + (rng.random((n_samples, len(centre))) - 0.5) * width / (2 ** r)
+        if r == 0:
+            U[0] = centre  # always score the current prices
+        mult = np.exp(np.clip(U[:, :len(tiers)], lo, hi))
+        conv = np.clip(1 + U[:, len(tiers):], 1 - conversion_swing, 1 + conversion_swing) if conversion_swing > 0 else 1.0
+
+        vals = np.repeat(model.offer_values[None], n_samples, axis=0)
+        vals[:, :, :2] *= mult[:, offer_t][:, :, None]
+        demand = np.ones((n_samples, len(model.prob)))
+        has_t = flow_t >= 0
+        demand[:, has_t] = mult[:, flow_t[has_t]] ** -eps[flow_t[has_t]]
+        prob = np.clip(model.prob * conv * demand, 0.0, 1.0)
+        _, rev, con = evaluate(model, cohort, months, vals, prob, strict=False)
+
+        tier_price = np.zeros((n_samples, len(tiers)))
+        np.add.at(tier_price.T, offer_t, vals[:, :, 0].T)
+        tier_price /= np.maximum(counts, 1)
+        # Only draws whose own loop never decays come back non-finite; they are flagged, not the batch
+        looping = ~np.isfinite(con).all(axis=1)
+        ok = ~looping
+        for a, b in zip(ordered, ordered[1:]):
+            ok &= tier_price[:, a] < tier_price[:, b]
+            if max_jump:
+                ok &= (tier_price[:, a] <= 0) | (tier_price[:, b] <= max_jump * tier_price[:, a])
+        batch = pd.DataFrame(mult, columns=[f"mult_{t}" for t in tiers])
+        for i, t in enumerate(tiers):
+            batch[f"price_{t}"] = tier_price[:, i]
+        if conversion_swing > 0:
+            for j, name in enumerate(model.flow_names):
+                batch[f"prob · {name}"] = prob[:, j]
+        batch["revenue"] = np.nansum(rev, axis=1)
+        batch["contribution"] = np.nansum(con, axis=1)
+        batch["looping"] = looping
+        batch["feasible"] = ok
+        batches.append(batch)
+        if ok.any():
+            best = int(np.argmax(np.where(ok, batch["contribution"], -np.inf)))
+            centre = U[best].copy()
+
+    cand = pd.concat(batches, ignore_index=True)
+    feas = cand[cand["feasible"]].reset_index(drop=True)
+    front = feas.iloc[pareto_front(feas["revenue"].to_numpy(), feas["contribution"].to_numpy())] if len(feas) else feas
+    best = feas.loc[feas["contribution"].idxmax()] if len(feas) else None
+    return {"candidates": cand, "frontier": front.reset_index(drop=True), "best": best, "tiers": tiers}
@@ -1,9 +1,13 @@
+import io, gzip, os, time
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
+from dataset_store import DatasetStore
+from upload_ingest import IngestJobs, arrow_types, columns_key, infer_schema, open_mapped, sniff_sample, spill_upload, suggest_mapping
+
 px.defaults.template = "plotly_dark"
 st.set_page_config(page_title="Offer Profitability Analyzer", layout="wide")
 st.title("Offer Profitability Analyzer — Expert Edition")
@@ -20,18 +24,45 @@ sample = pd.DataFrame({
     "units": [10, 6, 40, 20, 12]
 })
 
+@st.cache_resource
+def ingest_jobs() -> IngestJobs:
+    return IngestJobs()
+
+@st.cache_resource
+def dataset_store() -> DatasetStore:
+    # Evicted tables take their Arrow file on disk with them
+    return DatasetStore(on_evict=ingest_jobs().discard)
+
 with st.sidebar:
     st.header("Data")
     mode = st.radio("Mode", ["Upload CSV/XLSX", "Manual editor"], index=0)
 
+# field -> (header names to look for, expected kind, required)
+MAPPING_FIELDS = {
+    "offer": (["offer","product","name"], "categorical", True),
+    "revenue": (["revenue","sales","amount"], "numeric", True),
+    "cogs": (["cogs","cost","cost_of_goods_sold"], "numeric", True),
+    "date": (["date","period"], "date", False),
+    "segment": (["segment","tier","channel"], "categorical", False),
+    "variable": (["variable_costs","marketing_spend"], "numeric", False),
+    "units": (["units","qty","quantity"], "numeric", False),
+}
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def sniff_schema(path: str) -> pd.DataFrame:
+    # Header + bounded sample only; the full file is parsed after the mapping is confirmed
+    return infer_schema(sniff_sample(path))
+
+up = None
 if mode == "Upload CSV/XLSX":
     with st.sidebar:
         up = st.file_uploader("Upload file", type=["csv","xlsx"])
     if up is not None:
-        if up.name.lower().endswith(".xlsx"):
-            df = pd.read_excel(up)
-        else:
-            df = pd.read_csv(up)
+        # Spill to disk once per upload; parsing then streams from the file, not from an in-memory copy
+        if st.session_state.get("upload_id") != up.file_id or not os.path.exists(st.session_state.upload_path):
+            st.session_state.upload_key, st.session_state.upload_path = spill_upload(up)
+            st.session_state.upload_id = up.file_id
+        schema = sniff_schema(st.session_state.upload_path)
     else:
         st.info("No file uploaded — using sample.")
         df = sample.copy()
@@ -42,25 +73,63 @@ else:
     st.session_state.df_edit = df.copy()
     st.download_button("⬇️ Download table (CSV)", data=df.to_csv(index=False), file_name="offers_current.csv", mime="text/csv")
 
+if up is None:
+    schema = infer_schema(df)
+
 st.markdown("---")
 st.subheader("Column Mapping")
-cols = list(df.columns)
-def guess(names, default):
-    for n in names:
-        for c in cols:
-            if c.lower().strip() == n:
-                return c
-    return default
-
-offer_col = st.selectbox("Offer", cols, index=cols.index(guess(["offer","product","name"], cols[0])) if cols else 0)
-rev_col   = st.selectbox("Revenue", cols, index=cols.index(guess(["revenue","sales","amount"], cols[0])) if cols else 0)
-cogs_col  = st.selectbox("COGS", cols, index=cols.index(guess(["cogs","cost","cost_of_goods_sold"], cols[0])) if cols else 0)
-date_col  = st.selectbox("Date (optional)", ["<none>"]+cols, index=(["<none>"]+cols).index(guess(["date","period"], "<none>")))
-seg_col   = st.selectbox("Segment (optional)", ["<none>"]+cols, index=(["<none>"]+cols).index(guess(["segment","tier","channel"], "<none>")))
-var_col   = st.selectbox("Variable costs (optional)", ["<none>"]+cols, index=(["<none>"]+cols).index(guess(["variable_costs","marketing_spend"], "<none>")))
-units_col = st.selectbox("Units (optional)", ["<none>"]+cols, index=(["<none>"]+cols).index(guess(["units","qty","quantity"], "<none>")))
-
-work = df.copy()
+cols = schema["column"].tolist()
+suggested = suggest_mapping(schema, MAPPING_FIELDS)
+def guess(field, default):
+    return suggested[field][0] or default
+
+offer_col = st.selectbox("Offer", cols, index=cols.index(guess("offer", cols[0])) if cols else 0)
+rev_col   = st.selectbox("Revenue", cols, index=cols.index(guess("revenue", cols[0])) if cols else 0)
+cogs_col  = st.selectbox("COGS", cols, index=cols.index(guess("cogs", cols[0])) if cols else 0)
+date_col  = st.selectbox("Date (optional)", ["<none>"]+cols, index=(["<none>"]+cols).index(guess("date", "<none>")))
+seg_col   = st.selectbox("Segment (optional)", ["<none>"]+cols, index=(["<none>"]+cols).index(guess("segment", "<none>")))
+var_col   = st.selectbox("Variable costs (optional)", ["<none>"]+cols, index=(["<none>"]+cols).index(guess("variable", "<none>")))
+units_col = st.selectbox("Units (optional)", ["<none>"]+cols, index=(["<none>"]+cols).index(guess("units", "<none>")))
+
+with st.expander("Detected schema & mapping confidence"):
+    st.dataframe(schema, use_container_width=True, hide_index=True)
+    st.dataframe(
+        pd.DataFrame([{"field": f, "suggested_column": c or "<none>", "confidence": conf} for f, (c, conf) in suggested.items()]),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+if up is not None:
+    mapped = list(dict.fromkeys(c for c in [offer_col, rev_col, cogs_col, date_col, seg_col, var_col, units_col] if c != "<none>"))
+    key = columns_key(st.session_state.upload_key, mapped)
+    if st.session_state.get("confirmed_key") != key:
+        st.caption(f"Sampled {len(cols)} columns. Only the {len(mapped)} mapped columns will be parsed.")
+        if not st.button("Confirm mapping & load data"):
+            st.info("Check the column mapping above, then confirm to load the file.")
+            st.stop()
+        st.session_state.confirmed_key = key
+    # Sessions that open the same workbook share one immutable table; each holds only a handle
+    handle = st.session_state.get("dataset")
+    if handle is None or handle.key != key:
+        ingest_jobs().sweep(dataset_store().keys() + [st.session_state.upload_key])
+        job = ingest_jobs().start(key, st.session_state.upload_path, mapped, arrow_types(schema, mapped))
+        if not job.done:
+            # Poll with reruns instead of blocking the script thread, so the widgets above stay live
+            st.progress(job.progress, text=f"Ingesting {up.name}… {job.progress:.0%}")
+            time.sleep(0.5)
+            st.rerun()
+        if job.error is not None:
+            st.error(f"Could not read {up.name}: {job.error}")
+            st.stop()
+        handle = dataset_store().acquire(key, lambda: open_mapped(job.dest))
+        st.session_state.dataset = handle
+    df = handle.frame()
+    with st.sidebar:
+        stats = dataset_store().stats()
+        st.caption(f"Shared datasets in memory: {stats['datasets']} ({stats['bytes'] / 1e6:,.1f} MB, {stats['viewers']} viewers)")
+
+# Shallow copy: columns are replaced below, never written in place, so a shared frame stays untouched
+work = df.copy(deep=False)
 for c in [rev_col, cogs_col] + ([var_col] if var_col!="<none>" else []) + ([units_col] if units_col!="<none>" else []):
     if c!="<none>":
         work[c] = pd.to_numeric(work[c], errors="coerce")
@@ -101,25 +170,54 @@ if seg_pick!="<All>" and seg_col!="<none>":
 
 st.markdown("---")
 st.subheader("Offer Summary")
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_summary(work: pd.DataFrame, group_cols: list[str], agg: dict, rev_col: str) -> pd.DataFrame:
+    summ = work.groupby(group_cols).agg(agg).reset_index()
+    summ["gross_margin_pct"] = np.where(summ[rev_col]>0, summ["gross_profit"]/summ[rev_col], np.nan)
+    if "contribution_profit" in summ.columns:
+        summ["contribution_margin_pct"] = np.where(summ[rev_col]>0, summ["contribution_profit"]/summ[rev_col], np.nan)
+    return summ
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def sorted_positions(summ: pd.DataFrame, sort_col: str, ascending: bool, query: str, search_cols: tuple) -> np.ndarray:
+    # Row positions after search + sort; pages are sliced from this so only the visible rows get copied
+    pos = np.arange(len(summ))
+    if query:
+        hit = np.zeros(len(summ), dtype=bool)
+        for c in search_cols:
+            hit |= summ[c].astype(str).str.contains(query, case=False, regex=False).to_numpy()
+        pos = pos[hit]
+    keys = summ[sort_col].to_numpy()[pos]
+    order = pd.Series(keys).sort_values(ascending=ascending, na_position="last", kind="stable").index.to_numpy()
+    return pos[order]
+
 group_cols = [offer_col] + ([seg_col] if seg_col!="<none>" else [])
 agg = {rev_col:"sum", cogs_col:"sum", "gross_profit":"sum"}
 if var_col!="<none>":
     agg["contribution_profit"] = "sum"
 if units_col!="<none>":
     agg[units_col] = "sum"
-summ = work.groupby(group_cols).agg(agg).reset_index()
-summ["gross_margin_pct"] = np.where(summ[rev_col]>0, summ["gross_profit"]/summ[rev_col], np.nan)
-if "contribution_profit" in summ.columns:
-    summ["contribution_margin_pct"] = np.where(summ[rev_col]>0, summ["contribution_profit"]/summ[rev_col], np.nan)
+summ = build_summary(work, group_cols, agg, rev_col)
 
 with st.sidebar:
     st.header("Sort by")
     metric = st.selectbox("Metric", [rev_col,"gross_profit","gross_margin_pct"] + (["contribution_profit","contribution_margin_pct"] if "contribution_profit" in summ.columns else []), index=1)
-summ_sorted = summ.sort_values(metric, ascending=False)
-st.dataframe(summ_sorted.round(3), use_container_width=True)
+    ascending = st.checkbox("Ascending", value=False)
+
+t1, t2, t3 = st.columns([3, 1, 1])
+query = t1.text_input("Search offers", placeholder="Filter by offer or segment name")
+page_size = t2.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+view_pos = sorted_positions(summ, metric, ascending, query.strip(), tuple(group_cols))
+n_pages = max(1, -(-len(view_pos) // page_size))
+page = t3.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1)
+start = (int(page) - 1) * page_size
+page_df = summ.iloc[view_pos[start:start + page_size]]
+st.dataframe(page_df.round(3), use_container_width=True, hide_index=True)
+st.caption(f"Rows {min(start + 1, len(view_pos))}–{start + len(page_df)} of {len(view_pos)} (total offers × segments: {len(summ)})")
 
 st.subheader("Charts")
-top_n = st.slider("Top N (bar)", 3, 50, min(10, len(summ_sorted)), 1)
+top_n = st.slider("Top N (bar)", 3, 50, min(10, len(summ)), 1)
 bar_df = summ.sort_values("gross_profit", ascending=False).head(top_n)
 fig_bar = px.bar(bar_df, x=offer_col, y="gross_profit", color=rev_col, title="Top Offers by Gross Profit", hover_data=[rev_col, "gross_margin_pct"])
 st.plotly_chart(fig_bar, use_container_width=True)
@@ -168,5 +266,45 @@ st.write("- " + "\n- ".join(flags) if flags else "All checks passed.")
 
 st.markdown("---")
 st.subheader("Downloads")
-st.download_button("⬇️ Offer summary (CSV)", data=summ_sorted.to_csv(index=False), file_name="offer_summary.csv", mime="text/csv")
-st.download_button("⬇️ Pareto table (CSV)", data=pareto.to_csv(index=False), file_name="pareto_revenue.csv", mime="text/csv")
+st.caption("Exports are built only when requested and reused while the result is unchanged.")
+
+EXPORT_CHUNK_ROWS = 100_000
+EXPORT_FORMATS = {
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "CSV": (".csv", "text/csv"),
+}
+
+@st.cache_data(show_spinner="Preparing export…", max_entries=8)
+def export_bytes(frame: pd.DataFrame, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "Parquet":
+        frame.to_parquet(buf, index=False)
+        return buf.getvalue()
+    # Write CSV in row chunks straight into the (optionally gzipped) buffer instead of one big string
+    raw = gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6) if fmt == "CSV (gzip)" else buf
+    out = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    for start in range(0, max(len(frame), 1), EXPORT_CHUNK_ROWS):
+        frame.iloc[start:start + EXPORT_CHUNK_ROWS].to_csv(out, index=False, header=start == 0)
+    out.detach()
+    if raw is not buf:
+        raw.close()
+    return buf.getvalue()
+
+def export_controls(label: str, frame, file_stem: str, key: str):
+    # `frame` may be a callable so a full sorted copy is only built when an export is requested
+    c1, c2 = st.columns([2, 1])
+    fmt = c1.selectbox(f"{label} format", list(EXPORT_FORMATS), key=f"{key}_fmt")
+    if c2.button(f"Prepare {label.lower()}", key=f"{key}_prep"):
+        ext, mime = EXPORT_FORMATS[fmt]
+        if callable(frame):
+            frame = frame()
+        try:
+            data = export_bytes(frame, fmt)
+        except ImportError:
+            st.info("Install `pyarrow` for Parquet export.")
+            return
+        st.download_button(f"⬇️ {label} ({fmt})", data=data, file_name=file_stem + ext, mime=mime, key=f"{key}_dl")
+
+export_controls("Offer summary", lambda: summ.iloc[sorted_positions(summ, metric, ascending, "", ())], "offer_summary", "exp_summary")
+export_controls("Pareto table", pareto, "pareto_revenue", "exp_pareto")
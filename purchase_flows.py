@@ -0,0 +1,227 @@
+# Purchase-log flow estimation – empirical transition probabilities and time-to-transition from customer × offer × date rows
+
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+PARTITIONS = 16
+CSV_BLOCK_BYTES = 4 * 1024 * 1024
+MAX_GAP_DAYS = 3 * 365
+Z_95 = 1.959963984540054
+NO_DATE = np.iinfo(np.int32).min
+PART_SCHEMA = pa.schema([("customer", pa.uint64()), ("state", pa.int32()), ("day", pa.int32())])
+
+
+def wilson_interval(k: np.ndarray, n: np.ndarray, z: float = Z_95) -> tuple[np.ndarray, np.ndarray]:
+    """Wilson score interval for k successes out of n; stays inside [0, 1] even for small n."""
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    safe = np.maximum(n, 1.0)
+    p = k / safe
+    centre = (p + z ** 2 / (2 * safe)) / (1 + z ** 2 / safe)
+    half = z * np.sqrt(p * (1 - p) / safe + z ** 2 / (4 * safe ** 2)) / (1 + z ** 2 / safe)
+    return np.where(n > 0, centre - half, 0.0), np.where(n > 0, centre + half, 1.0)
+
+
+def log_columns(path: str) -> list[str]:
+    """Header of a CSV or Parquet purchase log without reading its rows."""
+    if path.lower().endswith(".parquet"):
+        return pq.read_schema(path).names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def iter_batches(path: str, columns: list[str]):
+    """Record batches of `columns` from a CSV or Parquet file, streamed block by block."""
+    if path.lower().endswith(".parquet"):
+        yield from pq.ParquetFile(path).iter_batches(columns=columns)
+        return
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_BYTES),
+        convert_options=pacsv.ConvertOptions(include_columns=columns),
+    )
+    yield from reader
+
+
+def _customer_keys(col: pa.Array) -> np.ndarray:
+    # Integer ids are used as-is; anything else is hashed once per distinct value in the batch
+    if pa.types.is_integer(col.type):
+        return pc.fill_null(col, 0).to_numpy(zero_copy_only=False).astype(np.uint64)
+    enc = pc.dictionary_encode(col.cast(pa.string()))
+    hashed = pd.util.hash_array(enc.dictionary.to_numpy(zero_copy_only=False).astype(object))
+    return np.r_[hashed, np.uint64(0)][pc.fill_null(enc.indices, len(hashed)).to_numpy(zero_copy_only=False)]
+
+
+def _days(col: pa.Array) -> np.ndarray:
+    # Days since epoch; NO_DATE marks values that could not be read as dates
+    if pa.types.is_timestamp(col.type) or pa.types.is_date(col.type):
+        secs = pc.cast(pc.cast(col, pa.timestamp("s")), pa.int64())
+        days = pc.fill_null(secs, NO_DATE * 86400).to_numpy(zero_copy_only=False) // 86400
+    else:
+        parsed = pd.to_datetime(pd.Series(col.to_numpy(zero_copy_only=False)), errors="coerce", format="mixed")
+        days = parsed.to_numpy("datetime64[D]").astype("int64")
+        days[parsed.isna().to_numpy()] = NO_DATE
+    return days
+
+
+class Vocabulary:
+    """Stable integer codes for state labels, grown batch by batch."""
+
+    def __init__(self):
+        self.labels: list[str] = []
+        self._codes: dict[str, int] = {}
+
+    def encode(self, col: pa.Array, state_map: dict | None) -> np.ndarray:
+        enc = pc.dictionary_encode(col.cast(pa.string()))
+        local = enc.dictionary.to_pylist()
+        lookup = np.empty(len(local), dtype=np.int32)
+        for i, label in enumerate(local):
+            label = str(label).strip()
+            if state_map is not None:
+                label = str(state_map.get(label, label))
+            code = self._codes.get(label)
+            if code is None:
+                code = self._codes[label] = len(self.labels)
+                self.labels.append(label)
+            lookup[i] = code
+        lookup = np.r_[lookup, np.int32(-1)]
+        return lookup[pc.fill_null(enc.indices, len(local)).to_numpy(zero_copy_only=False)]
+
+
+def _partition(path, customer_col, offer_col, date_col, state_map, spill_dir, partitions):
+    """Pass 1: stream the log once, writing compact (customer, state, day) rows into hash partitions."""
+    vocab = Vocabulary()
+    writers = [
+        pa.ipc.new_file(os.path.join(spill_dir, f"part-{i}.arrow"), PART_SCHEMA) for i in range(partitions)
+    ]
+    rows = dropped = 0
+    try:
+        for batch in iter_batches(path, [customer_col, offer_col, date_col]):
+            cust_col, offer, date = (batch.column(c) for c in (customer_col, offer_col, date_col))
+            cust = _customer_keys(cust_col)
+            state = vocab.encode(offer, state_map)
+            day = _days(date)
+            ok = ~cust_col.is_null().to_numpy(zero_copy_only=False) & (state >= 0) & (day != NO_DATE)
+            rows += len(ok)
+            dropped += int((~ok).sum())
+            cust, state, day = cust[ok], state[ok], day[ok].astype(np.int32)
+            part = (cust % np.uint64(partitions)).astype(np.intp)
+            order = np.argsort(part, kind="stable")
+            bounds = np.searchsorted(part[order], np.arange(partitions + 1))
+            for i in range(partitions):
+                sel = order[bounds[i]:bounds[i + 1]]
+                if len(sel):
+                    writers[i].write_batch(pa.record_batch([cust[sel], state[sel], day[sel]], schema=PART_SCHEMA))
+    finally:
+        for w in writers:
+            w.close()
+    return vocab.labels, rows, dropped
+
+
+def _count_partition(table: pa.Table, V: int, max_gap: int):
+    """Pass 2 for one partition: sort by (customer, day), shift by one and count consecutive pairs."""
+    cust = table.column("customer").to_numpy()
+    state = table.column("state").to_numpy().astype(np.int64)
+    day = table.column("day").to_numpy()
+    # lexsort is stable, so same-day purchases keep their file order
+    order = np.lexsort((day, cust))
+    cust, state, day = cust[order], state[order], day[order]
+    same = cust[1:] == cust[:-1]
+    first = np.r_[True, ~same] if len(cust) else np.zeros(0, dtype=bool)
+    pair = state[:-1][same] * V + state[1:][same]
+    gap = np.clip(day[1:][same] - day[:-1][same], 0, max_gap)
+    return (
+        np.bincount(state, minlength=V),
+        np.bincount(state[first], minlength=V),
+        pd.Series(pair).value_counts(),
+        pd.Series(pair * (max_gap + 1) + gap).value_counts(),
+    )
+
+
+def _gap_quantiles(gap_counts: pd.Series, max_gap: int, q=(0.25, 0.5, 0.75)) -> pd.DataFrame:
+    # Quantiles read off the cumulative per-pair day histogram
+    keys = gap_counts.index.to_numpy()
+    df = pd.DataFrame({"pair": keys // (max_gap + 1), "days": keys % (max_gap + 1), "n": gap_counts.to_numpy()})
+    df = df.sort_values(["pair", "days"])
+    df["cum"] = df.groupby("pair")["n"].cumsum() / df.groupby("pair")["n"].transform("sum")
+    out = {}
+    for p in q:
+        out[f"p{int(p * 100)}_days"] = df[df["cum"] >= p].groupby("pair")["days"].first()
+    out["mean_days"] = (df["days"] * df["n"]).groupby(df["pair"]).sum() / df.groupby("pair")["n"].sum()
+    return pd.DataFrame(out)
+
+
+def estimate_flows(
+    path: str,
+    customer_col: str = "customer",
+    offer_col: str = "offer",
+    date_col: str = "date",
+    state_map: dict | None = None,
+    min_transitions: int = 1,
+    partitions: int = PARTITIONS,
+    max_gap_days: int = MAX_GAP_DAYS,
+    spill_dir: str | None = None,
+) -> dict:
+    """Empirical flows from a purchase log (CSV or Parquet) with bounded memory.
+
+    Each customer's purchases are ordered by date and every consecutive pair a → b counts as one
+    transition; prob(a → b) = transitions / purchases of a, which is the maximum-likelihood
+    estimate for the ecosystem's Markov model. `state_map` relabels offers (e.g. offer → tier for
+    tier-level flows). Returns {"flows", "entries", "rows", "dropped"}: `flows` has the
+    source_tier/target_tier/label/prob/notes columns of flows.csv plus counts, a 95% Wilson
+    interval and time-to-transition quantiles (days, capped at `max_gap_days`).
+    """
+    tmp = tempfile.mkdtemp(prefix="flows_", dir=spill_dir)
+    try:
+        labels, rows, dropped = _partition(path, customer_col, offer_col, date_col, state_map, tmp, partitions)
+        V = max(len(labels), 1)
+        arrivals = np.zeros(V, dtype=np.int64)
+        entries = np.zeros(V, dtype=np.int64)
+        # Running totals keep memory bounded by distinct (pair, day) keys rather than by rows
+        pair_counts = pd.Series(dtype="int64")
+        gap_counts = pd.Series(dtype="int64")
+        for i in range(partitions):
+            with pa.memory_map(os.path.join(tmp, f"part-{i}.arrow"), "r") as src:
+                table = pa.ipc.open_file(src).read_all()
+            if table.num_rows == 0:
+                continue
+            a, e, p, g = _count_partition(table, V, max_gap_days)
+            arrivals += a
+            entries += e
+            pair_counts = pair_counts.add(p, fill_value=0)
+            gap_counts = gap_counts.add(g, fill_value=0)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    names = np.array(labels, dtype=object)
+    pair_counts = pair_counts[pair_counts >= min_transitions].astype("int64")
+    src, tgt = pair_counts.index.to_numpy() // V, pair_counts.index.to_numpy() % V
+    k, n = pair_counts.to_numpy(), arrivals[src]
+    low, high = wilson_interval(k, n)
+    flows = pd.DataFrame({
+        "source_tier": names[src],
+        "target_tier": names[tgt],
+        "label": "Observed",
+        "prob": k / np.maximum(n, 1),
+        "notes": [f"{a:,} of {b:,} purchases" for a, b in zip(k, n)],
+        "transitions": k,
+        "source_purchases": n,
+        "prob_low": low,
+        "prob_high": high,
+    })
+    if len(gap_counts):
+        timing = _gap_quantiles(gap_counts.astype("int64"), max_gap_days)
+        for c, values in timing.reindex(pair_counts.index).items():
+            flows[c] = values.to_numpy()
+    flows = flows.sort_values(["source_tier", "prob"], ascending=[True, False]).reset_index(drop=True)
+    entry_mix = pd.Series(entries[:len(labels)], index=labels, name="first_purchases").sort_values(ascending=False)
+    return {"flows": flows, "entries": entry_mix, "rows": rows, "dropped": dropped}
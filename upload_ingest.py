@@ -0,0 +1,281 @@
+# Large upload ingestion – spill to disk, parse on a worker thread, serve a memory-mapped Arrow file
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "ascendea_uploads")
+COPY_CHUNK_BYTES = 8 * 1024 * 1024
+CSV_BLOCK_BYTES = 8 * 1024 * 1024
+SNIFF_ROWS = 2000
+SPILL_MAX_AGE_S = 6 * 3600
+SPILL_MAX_BYTES = 20 * 1024 ** 3
+KIND_THRESHOLD = 0.9
+
+
+def spill_upload(upload, spill_dir: str = SPILL_DIR) -> tuple[str, str]:
+    """Copy an uploaded file to disk in chunks, hashing as it goes; returns (content key, path)."""
+    os.makedirs(spill_dir, exist_ok=True)
+    name = upload.name.lower()
+    ext = next((e for e in (".xlsx", ".parquet") if name.endswith(e)), ".csv")
+    h = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=spill_dir, suffix=ext + ".part")
+    upload.seek(0)
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = upload.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            h.update(chunk)
+            out.write(chunk)
+    upload.seek(0)
+    key = h.hexdigest()
+    path = os.path.join(spill_dir, key + ext)
+    os.replace(tmp, path)
+    return key, path
+
+
+def _upload_key(name: str) -> str:
+    # "<sha>.csv", "<sha>-<cols>.arrow" and "<sha>-<cols>.arrow.part" all belong to upload <sha>
+    return name.split(".", 1)[0].split("-", 1)[0]
+
+
+def sweep_spill(spill_dir: str = SPILL_DIR, keep: set | None = None, max_age_s: float = SPILL_MAX_AGE_S,
+                max_bytes: int = SPILL_MAX_BYTES) -> int:
+    """Delete spill files older than `max_age_s`, then oldest-first until under `max_bytes`.
+
+    Files whose upload key is in `keep` are never touched. Returns the number of files removed.
+    """
+    keep = keep or set()
+    try:
+        names = os.listdir(spill_dir)
+    except FileNotFoundError:
+        return 0
+    entries = []
+    for name in names:
+        path = os.path.join(spill_dir, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, name, path))
+    entries.sort()
+    total = sum(size for _, size, _, _ in entries)
+    now = time.time()
+    removed = 0
+    for mtime, size, name, path in entries:
+        stale = now - mtime > max_age_s
+        # A .part file is still being written unless it has gone stale
+        if _upload_key(name) in keep or (name.endswith(".part") and not stale):
+            continue
+        if not stale and total <= max_bytes:
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue
+        total -= size
+    return removed
+
+
+def columns_key(key: str, columns: list[str]) -> str:
+    """Key for a parse of a subset of columns from the upload identified by `key`."""
+    return key + "-" + hashlib.sha1("\x1f".join(columns).encode("utf-8")).hexdigest()[:12]
+
+
+def sniff_sample(path: str, n_rows: int = SNIFF_ROWS) -> pd.DataFrame:
+    """Read only the header and the first `n_rows` rows of a spilled upload."""
+    if path.lower().endswith(".xlsx"):
+        return pd.read_excel(path, nrows=n_rows)
+    return pd.read_csv(path, nrows=n_rows)
+
+
+def infer_kind(s: pd.Series) -> tuple[str, float]:
+    """Classify a column as numeric, date or categorical; returns the kind and the share of values that fit it."""
+    v = s.dropna()
+    if v.empty:
+        return "categorical", 0.0
+    if pd.api.types.is_numeric_dtype(v) and not pd.api.types.is_bool_dtype(v):
+        return "numeric", 1.0
+    if pd.api.types.is_datetime64_any_dtype(v):
+        return "date", 1.0
+    num_share = float(pd.to_numeric(v, errors="coerce").notna().mean())
+    if num_share >= KIND_THRESHOLD:
+        return "numeric", num_share
+    date_share = float(pd.to_datetime(v.astype(str), errors="coerce", format="mixed").notna().mean())
+    if date_share >= KIND_THRESHOLD:
+        return "date", date_share
+    return "categorical", 1.0 - num_share
+
+
+def infer_schema(sample: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for c in sample.columns:
+        kind, share = infer_kind(sample[c])
+        rows.append({
+            "column": c,
+            "kind": kind,
+            "fit_share": round(share, 3),
+            "null_share": round(float(sample[c].isna().mean()), 3) if len(sample) else 0.0,
+        })
+    return pd.DataFrame(rows, columns=["column", "kind", "fit_share", "null_share"])
+
+
+def suggest_mapping(schema: pd.DataFrame, fields: dict) -> dict:
+    """Suggest a column per field as {field: (column or None, confidence 0–1)}.
+
+    `fields` maps a field name to (candidate header names, expected kind, required).
+    Confidence blends the header match (exact 1.0, partial 0.6) with how well the
+    sampled values fit the expected kind.
+    """
+    out = {}
+    for field, (names, kind, required) in fields.items():
+        best, best_score = None, 0.0
+        for col, col_kind, fit in zip(schema["column"], schema["kind"], schema["fit_share"]):
+            norm = str(col).lower().strip()
+            if norm in names:
+                name_score = 1.0
+            elif any(n in norm for n in names):
+                name_score = 0.6
+            else:
+                name_score = 0.0
+            kind_score = fit if col_kind == kind else 0.0
+            score = 0.6 * name_score + 0.4 * kind_score
+            if (name_score > 0 or required) and score > best_score:
+                best, best_score = col, score
+        out[field] = (best, round(best_score, 2))
+    return out
+
+
+def arrow_types(schema: pd.DataFrame, columns: list[str]) -> dict:
+    # Numeric columns parse straight to float64; dates and labels stay text and are converted by the caller
+    kinds = dict(zip(schema["column"], schema["kind"]))
+    return {c: pa.float64() if kinds.get(c) == "numeric" else pa.string() for c in columns}
+
+
+def frame_to_table(df: pd.DataFrame) -> pa.Table:
+    # Mixed-type object columns (common in XLSX) cannot be converted to Arrow as-is
+    for c in df.select_dtypes(include="object").columns:
+        df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def open_mapped(path: str) -> pa.Table:
+    """Open an Arrow IPC file without copying it onto the heap."""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+class IngestJob:
+    """Converts a spilled CSV/XLSX into an Arrow IPC file on a background thread."""
+
+    def __init__(self, src: str, dest: str, columns: list[str] | None = None, column_types: dict | None = None):
+        self.src = src
+        self.dest = dest
+        self.columns = columns
+        self.column_types = column_types or {}
+        self.progress = 0.0
+        self.error: Exception | None = None
+        self._done = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _run(self):
+        tmp = self.dest + ".part"
+        try:
+            if not os.path.exists(self.dest):
+                if self.src.lower().endswith(".xlsx"):
+                    self._write_table(frame_to_table(pd.read_excel(self.src, usecols=self.columns)), tmp)
+                else:
+                    self._convert_csv(tmp)
+                os.replace(tmp, self.dest)
+            self.progress = 1.0
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    @staticmethod
+    def _write_table(table: pa.Table, path: str):
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    def _convert_csv(self, tmp: str):
+        try:
+            self._stream_csv(tmp, self.column_types)
+        except pa.ArrowInvalid:
+            # Values disagreed with the sampled/inferred types further down the file; keep every column as text
+            names = self.columns or pd.read_csv(self.src, nrows=0).columns
+            self._stream_csv(tmp, {c: pa.string() for c in names})
+
+    def _stream_csv(self, tmp: str, column_types: dict):
+        size = max(os.path.getsize(self.src), 1)
+        convert = pacsv.ConvertOptions(
+            column_types=column_types,
+            include_columns=self.columns or [],
+            strings_can_be_null=True,
+        )
+        with open(self.src, "rb") as f:
+            reader = pacsv.open_csv(
+                f,
+                read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_BYTES),
+                convert_options=convert,
+            )
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+                    self.progress = min(f.tell() / size, 0.99)
+
+
+class IngestJobs:
+    """Process-wide registry so reruns and other sessions pick up an in-flight ingestion."""
+
+    def __init__(self, spill_dir: str = SPILL_DIR):
+        self.spill_dir = spill_dir
+        self._lock = threading.Lock()
+        self._jobs: dict[str, IngestJob] = {}
+
+    def start(self, key: str, src: str, columns: list[str] | None = None, column_types: dict | None = None) -> IngestJob:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.done and not os.path.exists(job.dest):
+                job = None  # its Arrow file was swept or evicted
+            if job is None or job.error is not None:
+                job = IngestJob(src, os.path.join(self.spill_dir, key + ".arrow"), columns, column_types)
+                self._jobs[key] = job
+            return job
+
+    def discard(self, key: str):
+        """Forget a finished job and delete its Arrow file; wired to the dataset store's eviction."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done:
+                return
+            self._jobs.pop(key, None)
+        try:
+            os.remove(os.path.join(self.spill_dir, key + ".arrow"))
+        except OSError:
+            pass
+
+    def sweep(self, keep_keys=()) -> int:
+        """Age/size sweep of the spill folder, sparing in-flight jobs and the datasets in `keep_keys`."""
+        with self._lock:
+            keep = {_upload_key(os.path.basename(j.dest)) for j in self._jobs.values() if not j.done}
+        keep |= {_upload_key(k) for k in keep_keys}
+        return sweep_spill(self.spill_dir, keep)
@@ -1,9 +1,37 @@
 # Value Equation App (Ascendea UI) – Themed, High-Contrast, Branded Chart
 
+import hashlib
+import os
+import tempfile
+import time
+
 import numpy as np
 import pandas as pd
 import streamlit as st
 import altair as alt
+import pyarrow as pa
+
+from purchase_flows import log_columns
+from upload_ingest import spill_upload
+from value_survey import aggregate_survey
+from value_equation_engine import (
+    FACTOR_COLS,
+    REQUIRED_COLS,
+    clean_and_prepare,
+    dense_rank,
+    group_buckets,
+    has_survey_stats,
+    log_matrix,
+    log_scores,
+    pareto_frontier,
+    random_weights,
+    score_intervals,
+    top_k_by_group,
+    top_rows,
+    weight_grid,
+    weight_sweep,
+    weight_vector,
+)
 
 # ---------- Theme Tokens ----------
 DARK_TOKENS = {
@@ -340,65 +368,64 @@ h1, h2, h3, h4, h5, h6, p, span, label {
 st.markdown(DARK_CSS if theme_choice == "Dark" else LIGHT_CSS, unsafe_allow_html=True)
 
 # ---------- Data helpers ----------
-REQUIRED_COLS = ["offer", "dream_outcome", "likelihood", "time_delay", "effort_sacrifice"]
-OPTIONAL_COLS = ["group"]
-
-def canonicalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    mapping = {
-        "offer": "offer",
-        "name": "offer",
-        "dream outcome": "dream_outcome",
-        "dream_outcome": "dream_outcome",
-        "outcome": "dream_outcome",
-        "likelihood": "likelihood",
-        "pol": "likelihood",
-        "probability": "likelihood",
-        "time delay": "time_delay",
-        "time_delay": "time_delay",
-        "time": "time_delay",
-        "effort & sacrifice": "effort_sacrifice",
-        "effort_sacrifice": "effort_sacrifice",
-        "effort": "effort_sacrifice",
-        "group": "group",
-        "segment": "group",
-        "competitor": "group",
-    }
-    df = df.copy()
-    df.columns = [c.strip().lower().replace("-", "_").replace(" ", "_") for c in df.columns]
-    df.rename(columns={c: mapping.get(c, c) for c in df.columns}, inplace=True)
-    return df
-
-def coerce_numeric(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
-    df = df.copy()
-    for c in cols:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-    return df
-
-def validate_required_columns(df: pd.DataFrame) -> list[str]:
-    return [c for c in REQUIRED_COLS if c not in df.columns]
-
-def compute_value_score(
-    df: pd.DataFrame,
-    w_outcome: float = 1.0,
-    w_likelihood: float = 1.0,
-    w_time: float = 1.0,
-    w_effort: float = 1.0,
-) -> pd.DataFrame:
-    df = df.copy()
-    for col in ["dream_outcome", "likelihood", "time_delay", "effort_sacrifice"]:
-        df[col] = df[col].replace([np.inf, -np.inf], np.nan)
-
-    num = (
-        df["dream_outcome"].clip(lower=1e-9) ** w_outcome
-        * df["likelihood"].clip(lower=1e-9) ** w_likelihood
-    )
-    den = (
-        df["time_delay"].clip(lower=1e-9) ** w_time
-        * df["effort_sacrifice"].clip(lower=1e-9) ** w_effort
-    )
-
-    df["value_score"] = num / den
-    return df
+EDITOR_MAX_ROWS = 5_000
+CHART_FRONTIER_MAX = 100
+DISPLAY_ROWS = 1_000
+# Per-chart data budget; rows beyond it are dropped lowest-score first
+CHART_MAX_BYTES = 150_000
+# Served at app/static/charts/ when server.enableStaticServing is on
+CHART_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "charts")
+CHART_STATIC_MAX_AGE_S = 30 * 60  # chart files unused this long are pruned
+
+def arrow_bytes(df: pd.DataFrame) -> int:
+    # Size of the Arrow IPC stream Streamlit sends for an inline chart dataset
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
+
+def chart_rows(df: pd.DataFrame, columns: list[str], scores: np.ndarray) -> pd.DataFrame:
+    """Project to the encoded columns and keep the highest-scoring rows that fit CHART_MAX_BYTES."""
+    projected = df[columns].reset_index(drop=True)
+    scores = np.asarray(scores, dtype=float)
+    data, size = projected, arrow_bytes(projected)
+    while size > CHART_MAX_BYTES and len(data) > 1:
+        keep = max(1, min(len(data) - 1, int(len(data) * 0.95 * CHART_MAX_BYTES / size)))
+        data = projected.iloc[np.sort(top_rows(scores, keep)[0])].reset_index(drop=True)
+        size = arrow_bytes(data)
+    return data
+
+def prune_chart_files():
+    # Other sessions prune the same folder concurrently, so a file may vanish between listdir and stat/remove
+    cutoff = time.time() - CHART_STATIC_MAX_AGE_S
+    for f in os.listdir(CHART_STATIC_DIR):
+        path = os.path.join(CHART_STATIC_DIR, f)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def chart_source(data: pd.DataFrame):
+    """A static URL for the chart rows when static serving is on, so reruns resend only the spec."""
+    if not st.get_option("server.enableStaticServing"):
+        return data
+    body = data.to_json(orient="records").encode("utf-8")
+    name = hashlib.sha1(body).hexdigest()[:20] + ".json"
+    path = os.path.join(CHART_STATIC_DIR, name)
+    try:
+        # Every rerun that shows this chart refreshes its age, so a live session's file is never pruned
+        os.utime(path)
+    except FileNotFoundError:
+        # Content-addressed, so identical data across reruns and sessions reuses one file
+        os.makedirs(CHART_STATIC_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CHART_STATIC_DIR, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+        prune_chart_files()
+    return alt.UrlData(url=f"app/static/charts/{name}", format=alt.DataFormat(type="json"))
 
 def starter_dataframe() -> pd.DataFrame:
     return pd.DataFrame(
@@ -412,25 +439,25 @@ def starter_dataframe() -> pd.DataFrame:
         }
     )
 
-def clean_and_prepare(df: pd.DataFrame) -> pd.DataFrame:
-    df = canonicalize_columns(df)
-    miss = validate_required_columns(df)
-    if miss:
-        raise ValueError("Missing required columns: " + ", ".join(miss))
+@st.cache_resource(max_entries=4, show_spinner="Preparing catalog…")
+def load_catalog(file_id: str, _upload):
+    # Keyed on the upload id so a large catalog is parsed and log-transformed once, not per slider move
+    df = clean_and_prepare(pd.read_csv(_upload))
+    return df, log_matrix(df), group_buckets(df["group"].to_numpy())
 
-    keep = [c for c in REQUIRED_COLS + OPTIONAL_COLS if c in df.columns]
-    df = df[keep].copy()
+@st.cache_data(max_entries=8, show_spinner="Sweeping weight vectors…")
+def run_sweep(L: np.ndarray, mode: str, low: float, high: float, size: int, seed: int) -> pd.DataFrame:
+    W = weight_grid(low, high, size) if mode == "Grid" else random_weights(size, low, high, seed)
+    return weight_sweep(L, W)
 
-    df = coerce_numeric(df, [c for c in REQUIRED_COLS if c != "offer"])
+@st.cache_resource(max_entries=4, show_spinner="Finding the Pareto frontier…")
+def dominance(data_key: str, _factors: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    # Keyed on the data, not the frame: hashing millions of rows on every slider move costs more than the scoring
+    return pareto_frontier(_factors)
 
-    for c in ["dream_outcome", "likelihood", "time_delay", "effort_sacrifice"]:
-        df[c] = df[c].clip(lower=0.1, upper=10)
-
-    if "group" not in df.columns:
-        df["group"] = "Company"
-
-    df["offer"] = df["offer"].astype(str).str.strip()
-    return df
+@st.cache_data(max_entries=4, show_spinner="Aggregating survey responses…")
+def load_survey(path: str, offer_col: str, factor_col: str, score_col: str, group_col: str | None) -> dict:
+    return aggregate_survey(path, offer_col, factor_col, score_col, group_col)
 
 def download_csv_button(df: pd.DataFrame, filename: str = "value_equation_results.csv"):
     csv_bytes = df.to_csv(index=False).encode("utf-8")
@@ -477,75 +504,155 @@ st.markdown(
 )
 
 # ---------- Data ingest ----------
+survey = None
 with st.container():
     upload_col, _ = st.columns([3, 2])
     with upload_col:
         st.markdown("#### 1. Load your offers")
-        uploaded = st.file_uploader(
-            "Upload CSV (offer, dream_outcome, likelihood, time_delay, effort_sacrifice, [group])",
-            type=["csv"],
+        source = st.radio("Input", ["Offer scores (1–10 averages)", "Survey responses"], horizontal=True)
+        if source == "Survey responses":
+            survey_up = st.file_uploader(
+                "Upload survey responses – one row per respondent × offer × factor (CSV or Parquet)",
+                type=["csv", "parquet"],
+                key="survey",
+            )
+            uploaded = None
+        else:
+            survey_up = None
+            uploaded = st.file_uploader(
+                "Upload CSV (offer, dream_outcome, likelihood, time_delay, effort_sacrifice, [group])",
+                type=["csv"],
+            )
+
+if survey_up is not None:
+    # Spill once per upload so the aggregator streams from disk instead of holding the file in memory;
+    # spill again if the shared spill folder was swept since the last rerun
+    if st.session_state.get("survey_id") != survey_up.file_id or not os.path.exists(st.session_state.survey_path):
+        _, st.session_state.survey_path = spill_upload(survey_up)
+        st.session_state.survey_id = survey_up.file_id
+    survey_cols = log_columns(st.session_state.survey_path)
+
+    def pick(col, label, name):
+        return col.selectbox(label, survey_cols, index=survey_cols.index(name) if name in survey_cols else 0)
+
+    c1, c2, c3, c4 = st.columns(4)
+    offer_col = pick(c1, "Offer column", "offer")
+    factor_col = pick(c2, "Factor column", "factor")
+    score_col = pick(c3, "Score column", "score")
+    group_col = c4.selectbox(
+        "Group column", ["(none)"] + survey_cols,
+        index=1 + survey_cols.index("group") if "group" in survey_cols else 0,
+    )
+    try:
+        survey = load_survey(
+            st.session_state.survey_path, offer_col, factor_col, score_col,
+            None if group_col == "(none)" else group_col,
         )
-
-if uploaded is not None:
+        df_in = clean_and_prepare(survey["stats"])
+    except Exception as e:
+        st.error(f"Error reading survey: {e}")
+        st.stop()
+    L_in = log_matrix(df_in)
+    st.success(
+        f"{survey['rows']:,} responses aggregated into {len(df_in):,} offers "
+        f"({survey['dropped']:,} skipped: missing offer or score, or an unrecognised factor)."
+    )
+elif uploaded is not None:
     try:
-        raw = pd.read_csv(uploaded)
-        df_in = clean_and_prepare(raw)
+        df_in, L_in, buckets_in = load_catalog(uploaded.file_id, uploaded)
         st.success("CSV loaded successfully.")
     except Exception as e:
         st.error(f"Error reading CSV: {e}")
         st.stop()
 else:
-    st.info("No CSV uploaded. Using the starter offers below.")
-    df_in = starter_dataframe()
+    st.info("No file uploaded. Using the starter offers below.")
+    df_in, L_in = starter_dataframe(), None
 
 # ---------- Edit / review ----------
-st.markdown(
-    """
-    <div class="asc-eyebrow" style="margin-top:1.25rem;">Step 2</div>
-    <h3 style="margin-top:0.25rem;">Review and edit your inputs</h3>
-    <p style="font-size:0.95rem;">
-      Keep everything on a 1–10 scale. Higher is better for outcome and likelihood.
-      Lower is better for time and effort.
-    </p>
-    """,
-    unsafe_allow_html=True,
-)
+if len(df_in) <= EDITOR_MAX_ROWS:
+    st.markdown(
+        """
+        <div class="asc-eyebrow" style="margin-top:1.25rem;">Step 2</div>
+        <h3 style="margin-top:0.25rem;">Review and edit your inputs</h3>
+        <p style="font-size:0.95rem;">
+          Keep everything on a 1–10 scale. Higher is better for outcome and likelihood.
+          Lower is better for time and effort.
+        </p>
+        """,
+        unsafe_allow_html=True,
+    )
 
-edited = st.data_editor(
-    df_in,
-    use_container_width=True,
-    num_rows="dynamic",
-    column_config={
-        "offer": st.column_config.TextColumn("Offer", help="Name of the offer / product / package"),
-        "dream_outcome": st.column_config.NumberColumn("Dream Outcome (1–10)"),
-        "likelihood": st.column_config.NumberColumn("Likelihood (1–10)"),
-        "time_delay": st.column_config.NumberColumn("Time Delay (1–10, lower = better)"),
-        "effort_sacrifice": st.column_config.NumberColumn("Effort & Sacrifice (1–10, lower = better)"),
-        "group": st.column_config.TextColumn("Group (optional, e.g. Company vs Competitor)"),
-    },
-)
+    edited = st.data_editor(
+        df_in,
+        use_container_width=True,
+        num_rows="dynamic",
+        # Survey variance/count columns stay in the frame for the intervals but are not hand-edited
+        column_order=REQUIRED_COLS + ["group"],
+        column_config={
+            "offer": st.column_config.TextColumn("Offer", help="Name of the offer / product / package"),
+            "dream_outcome": st.column_config.NumberColumn("Dream Outcome (1–10)"),
+            "likelihood": st.column_config.NumberColumn("Likelihood (1–10)"),
+            "time_delay": st.column_config.NumberColumn("Time Delay (1–10, lower = better)"),
+            "effort_sacrifice": st.column_config.NumberColumn("Effort & Sacrifice (1–10, lower = better)"),
+            "group": st.column_config.TextColumn("Group (optional, e.g. Company vs Competitor)"),
+        },
+    )
 
-try:
-    df_clean = clean_and_prepare(edited)
-except Exception as e:
-    st.error(f"Data validation error: {e}")
-    st.stop()
+    try:
+        df_clean = clean_and_prepare(edited)
+    except Exception as e:
+        st.error(f"Data validation error: {e}")
+        st.stop()
+    L = log_matrix(df_clean)
+else:
+    st.info(
+        f"{len(df_in):,} offers loaded. Inline editing is available up to {EDITOR_MAX_ROWS:,} rows – "
+        "edit the file and re-upload to change inputs."
+    )
+    df_clean, L = df_in, L_in
 
 # ---------- Compute ----------
-df_scored = compute_value_score(
-    df_clean,
-    w_outcome=w_outcome,
-    w_likelihood=w_likelihood,
-    w_time=w_time,
-    w_effort=w_effort,
+# One matrix-vector product in log space, then partial selection of the rows shown
+log_score = log_scores(L, weight_vector(w_outcome, w_likelihood, w_time, w_effort))
+top_idx, top_rank = top_rows(log_score, DISPLAY_ROWS)
+df_scored = df_clean.iloc[top_idx].assign(
+    value_score=np.exp(log_score[top_idx]), rank=top_rank
+).reset_index(drop=True)
+truncated = len(df_clean) > len(df_scored)
+interval_cols = []
+
+if df_clean is df_in and uploaded is not None:
+    # Large uploaded catalog, not editable: the upload id identifies the data and its group buckets
+    data_key, buckets = uploaded.file_id, buckets_in
+else:
+    data_key = hashlib.sha1(np.ascontiguousarray(df_clean[FACTOR_COLS].to_numpy(dtype=float)).tobytes()).hexdigest()
+    buckets = group_buckets(df_clean["group"].to_numpy())
+on_frontier, dominated_by = dominance(data_key, df_clean[FACTOR_COLS])
+offer_names = df_clean["offer"].to_numpy()
+df_scored["frontier"] = on_frontier[top_idx]
+df_scored["dominated_by"] = np.where(
+    dominated_by[top_idx] >= 0, offer_names[np.maximum(dominated_by[top_idx], 0)], ""
 )
 
-df_scored["rank"] = df_scored["value_score"].rank(ascending=False, method="dense").astype(int)
-df_scored = df_scored.sort_values(["rank", "value_score"], ascending=[True, False]).reset_index(drop=True)
-
 # ---------- Outputs: table ----------
 st.markdown("#### 3. Ranked value scores")
-st.caption("Higher scores indicate higher perceived value after friction.")
+st.caption(
+    "Higher scores indicate higher perceived value after friction."
+    + (f" Showing the top {len(df_scored):,} of {len(df_clean):,} offers." if truncated else "")
+)
+
+if has_survey_stats(df_clean):
+    ci1, ci2 = st.columns(2)
+    ci_method = ci1.radio("95% interval", ["Delta method", "Bootstrap"], horizontal=True)
+    ci_method = "delta" if ci_method == "Delta method" else "bootstrap"
+    ci2.caption(
+        "From each factor's survey variance and response count. Offers with fewer than two "
+        "responses on a factor have no interval."
+    )
+    weights = weight_vector(w_outcome, w_likelihood, w_time, w_effort)
+    low, high = score_intervals(df_scored, weights, method=ci_method)
+    df_scored = df_scored.assign(value_score_low=low, value_score_high=high)
+    interval_cols = ["value_score_low", "value_score_high"]
 
 st.dataframe(
     df_scored[
@@ -559,6 +666,8 @@ st.dataframe(
             "effort_sacrifice",
             "value_score",
         ]
+        + interval_cols
+        + ["frontier", "dominated_by"]
     ],
     use_container_width=True,
 )
@@ -566,6 +675,30 @@ st.dataframe(
 # ---------- Outputs: chart ----------
 st.markdown("#### 4. Visual comparison")
 
+k1, k2 = st.columns(2)
+chart_k = k1.slider("Top offers per group", 1, 50, 10)
+show_frontier = k2.checkbox("Add Pareto-frontier offers", value=True)
+chart_idx, _ = top_k_by_group(log_score, None, chart_k, buckets=buckets)
+if show_frontier:
+    # Frontier offers by score, capped so a flat catalog where most offers are undominated stays readable
+    frontier_idx = np.flatnonzero(on_frontier)
+    frontier_idx = frontier_idx[top_rows(log_score[frontier_idx], CHART_FRONTIER_MAX)[0]]
+    chart_idx = np.union1d(chart_idx, frontier_idx)
+df_chart = chart_rows(
+    df_clean.iloc[chart_idx].assign(
+        value_score=np.exp(log_score[chart_idx]),
+        frontier=np.where(on_frontier[chart_idx], "Frontier", "Dominated"),
+    ),
+    ["offer", "group", "value_score", "frontier"] + FACTOR_COLS,
+    log_score[chart_idx],
+)
+st.caption(
+    f"{int(on_frontier.sum()):,} offers are on the Pareto frontier – no other offer is at least as good on "
+    f"all four factors and better on one. Showing {len(df_chart):,} of {len(df_clean):,} offers; "
+    "frontier offers are drawn solid."
+    + (" Reduced to the highest scores to fit the chart size limit." if len(df_chart) < len(chart_idx) else "")
+)
+
 alt.themes.enable("none")
 
 # Axis + title colours:
@@ -579,7 +712,7 @@ else:
     chart_title_color = "#393939"
 
 chart = (
-    alt.Chart(df_scored)
+    alt.Chart(chart_source(df_chart))
     .mark_bar()
     .encode(
         x=alt.X("offer:N", sort="-y", title="Offer"),
@@ -600,7 +733,9 @@ chart = (
             alt.Tooltip("time_delay:Q", title="Time delay"),
             alt.Tooltip("effort_sacrifice:Q", title="Effort & sacrifice"),
             alt.Tooltip("value_score:Q", title="Value score", format=".3f"),
+            alt.Tooltip("frontier:N", title="Pareto"),
         ],
+        opacity=alt.condition(alt.datum.frontier == "Frontier", alt.value(1.0), alt.value(0.45)),
     )
     .properties(
         height=380,
@@ -629,9 +764,77 @@ chart = (
 
 st.altair_chart(chart, use_container_width=True)
 
+# ---------- Weight sweep ----------
+st.markdown("#### 5. Weight sweep")
+st.caption(
+    "Score every offer under many weight vectors at once to see how robust its ranking is. "
+    "Each block of weight vectors is a single matrix product over the whole catalog."
+)
+
+if st.checkbox("Run weight sweep", value=False):
+    s1, s2, s3, s4 = st.columns(4)
+    sweep_mode = s1.radio("Weights", ["Grid", "Random sample"], horizontal=True)
+    w_low, w_high = s2.slider("Weight range", 0.2, 3.0, (0.5, 2.0), 0.1)
+    if sweep_mode == "Grid":
+        steps = s3.slider("Steps per weight", 2, 12, 10)
+        sweep_size, sweep_seed = int(steps), 0
+        s4.metric("Weight vectors", f"{steps ** 4:,}")
+    else:
+        sweep_size = int(s3.selectbox("Weight vectors", [1_000, 10_000, 50_000], index=1))
+        sweep_seed = int(s4.number_input("Seed", min_value=0, value=42, step=1))
+
+    n_vectors = sweep_size ** 4 if sweep_mode == "Grid" else sweep_size
+    st.caption(f"{n_vectors:,} weight vectors × {len(df_clean):,} offers = {n_vectors * len(df_clean):,} scores.")
+
+    sweep = run_sweep(L, sweep_mode, float(w_low), float(w_high), sweep_size, sweep_seed)
+    sweep = pd.concat([df_clean[["offer", "group"]].reset_index(drop=True), sweep], axis=1)
+    sweep = sweep.sort_values(["p_first", "mean_rank"], ascending=[False, True], kind="stable")
+
+    st.dataframe(
+        sweep.head(DISPLAY_ROWS).style.format(
+            {c: "{:.1%}" for c in sweep.columns if c == "p_first" or c.startswith("rank ")} | {"mean_rank": "{:.1f}"}
+        ),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    top_sweep = sweep.head(25)[["offer", "p_first", "mean_rank", "best_rank", "worst_rank"]]
+    range_chart = alt.Chart(chart_source(top_sweep)).encode(y=alt.Y("offer:N", sort=None, title="Offer"))
+    st.altair_chart(
+        (
+            range_chart.mark_rule(strokeWidth=2, color="#94a3b8").encode(
+                x=alt.X("best_rank:Q", title="Rank across weight vectors (best – worst, ● mean)"),
+                x2="worst_rank:Q",
+            )
+            + range_chart.mark_circle(size=80, color="#00E4AB").encode(
+                x="mean_rank:Q",
+                tooltip=[
+                    alt.Tooltip("offer:N", title="Offer"),
+                    alt.Tooltip("p_first:Q", title="P(#1)", format=".1%"),
+                    alt.Tooltip("mean_rank:Q", title="Mean rank", format=".1f"),
+                    alt.Tooltip("best_rank:Q", title="Best rank"),
+                    alt.Tooltip("worst_rank:Q", title="Worst rank"),
+                ],
+            )
+        ).properties(height=max(200, 18 * len(top_sweep))),
+        use_container_width=True,
+    )
+    download_csv_button(sweep, "value_equation_weight_sweep.csv")
+
 # ---------- Download ----------
-st.markdown("#### 5. Export results")
-download_csv_button(df_scored)
+st.markdown("#### 6. Export results")
+if not truncated:
+    download_csv_button(df_scored)
+elif st.button("Prepare full ranked export"):
+    full = df_clean.assign(
+        value_score=np.exp(log_score),
+        rank=dense_rank(log_score),
+        frontier=on_frontier,
+        dominated_by=np.where(dominated_by >= 0, offer_names[np.maximum(dominated_by, 0)], ""),
+    )
+    if interval_cols:
+        full["value_score_low"], full["value_score_high"] = score_intervals(full, weights, method=ci_method)
+    download_csv_button(full.sort_values(["rank", "offer"], kind="stable"))
 
 # ---------- CSV helper ----------
 with st.expander("CSV format example"):
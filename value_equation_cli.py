@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+import argparse, glob, os, shutil, sys, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from purchase_flows import iter_batches, log_columns
+from value_equation_engine import (
+    FACTOR_COLS,
+    REQUIRED_COLS,
+    canonical_name,
+    clean_and_prepare,
+    dense_rank,
+    log_matrix,
+)
+
+PARTITIONS = 16
+OFFER_EXTS = (".csv", ".parquet")
+
+
+def find_files(paths):
+    """CSV/Parquet files named directly or found recursively under the given folders."""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, dirnames, names in os.walk(p):
+                dirnames.sort()
+                files += [os.path.join(dirpath, n) for n in sorted(names) if n.lower().endswith(OFFER_EXTS)]
+        elif p.lower().endswith(OFFER_EXTS):
+            files.append(p)
+    return files
+
+
+def read_profiles(path, specs):
+    """Weight profiles from a CSV (name, w_outcome, w_likelihood, w_time, w_effort) and/or name=w1,w2,w3,w4 flags."""
+    rows = []
+    if path:
+        prof = pd.read_csv(path)
+        cols = ["name", "w_outcome", "w_likelihood", "w_time", "w_effort"]
+        miss = [c for c in cols if c not in prof.columns]
+        if miss:
+            sys.exit(f"{path} is missing columns: {', '.join(miss)}")
+        rows += [(str(r[0]), [float(v) for v in r[1:]]) for r in prof[cols].itertuples(index=False)]
+    for spec in specs or []:
+        name, _, values = spec.partition("=")
+        weights = values.split(",")
+        if not name or len(weights) != 4:
+            sys.exit(f"Bad --weights {spec!r}; expected name=w_outcome,w_likelihood,w_time,w_effort")
+        rows.append((name.strip(), [float(v) for v in weights]))
+    if not rows:
+        rows = [("neutral", [1.0, 1.0, 1.0, 1.0])]
+    names = [n for n, _ in rows]
+    if len(set(names)) != len(names):
+        sys.exit("Weight profile names must be unique.")
+    return names, np.array([w for _, w in rows], dtype=float)
+
+
+def split_jobs(files, workers):
+    """One job per CSV; Parquet files are split by row group so a single large file still uses every worker."""
+    jobs = []
+    for path in files:
+        if path.lower().endswith(".parquet"):
+            n_groups = pq.ParquetFile(path).num_row_groups
+            for part in np.array_split(np.arange(n_groups), min(max(workers, 1), max(n_groups, 1))):
+                if len(part):
+                    jobs.append((path, part.tolist()))
+        else:
+            jobs.append((path, None))
+    return jobs
+
+
+def _chunks(path, row_groups, columns):
+    if row_groups is None:
+        yield from iter_batches(path, columns)
+    else:
+        yield from pq.ParquetFile(path).iter_batches(row_groups=row_groups, columns=columns)
+
+
+def score_file(job):
+    """Score one file (or row-group slice) batch by batch under every profile; rows are spilled by group hash.
+
+    Spills are staged per job and only moved into the partitions once the whole job has succeeded, so a
+    file that fails partway contributes no rows.
+    """
+    path, row_groups, names, W, spill_dir, tag = job
+    stage = os.path.join(spill_dir, f"_job-{tag}")
+    try:
+        os.makedirs(stage, exist_ok=True)
+        header = log_columns(path)
+        wanted = REQUIRED_COLS + ["group"]
+        columns = [c for c in header if canonical_name(c) in wanted]
+        rows = 0
+        for b, batch in enumerate(_chunks(path, row_groups, columns)):
+            df = clean_and_prepare(batch.to_pandas())
+            df["group"] = df["group"].fillna("Company").astype(str)
+            # Same schema in every spill file, whether a source stored its scores as int or float
+            df[FACTOR_COLS] = df[FACTOR_COLS].astype(float)
+            df.insert(0, "source", os.path.basename(path))
+            # One (profiles × 4) @ (4 × rows) product scores the chunk under every profile
+            logs = W @ log_matrix(df)
+            for name, row in zip(names, logs):
+                df[f"log_{name}"] = row
+            part = pd.util.hash_array(df["group"].to_numpy(dtype=object)) % PARTITIONS
+            for p in np.unique(part):
+                pq.write_table(
+                    pa.Table.from_pandas(df[part == p], preserve_index=False),
+                    os.path.join(stage, f"{p}-{b}.parquet"),
+                )
+            rows += len(df)
+        for name in sorted(os.listdir(stage)):
+            p, b = name[: -len(".parquet")].split("-")
+            out = os.path.join(spill_dir, f"p={p}")
+            os.makedirs(out, exist_ok=True)
+            os.replace(os.path.join(stage, name), os.path.join(out, f"{tag}-{b}.parquet"))
+        return path, rows, None
+    except Exception as e:
+        return path, 0, f"{type(e).__name__}: {e}"
+    finally:
+        shutil.rmtree(stage, ignore_errors=True)
+
+
+def rank_partition(job):
+    """Dense-rank every group in one spill partition under each profile and write one file per group."""
+    part_dir, names, out_dir = job
+    if not os.path.isdir(part_dir) or not os.listdir(part_dir):
+        return []
+    df = pq.read_table(part_dir).to_pandas()
+    written = []
+    for group, g in df.groupby("group", sort=False):
+        g = g.reset_index(drop=True)
+        for name in names:
+            log_score = g.pop(f"log_{name}").to_numpy()
+            g[f"score_{name}"] = np.exp(log_score)
+            g[f"rank_{name}"] = dense_rank(log_score)
+        g = g.sort_values([f"rank_{names[0]}", "offer"], kind="stable")
+        target = os.path.join(out_dir, f"group={quote(str(group), safe='')}")
+        os.makedirs(target, exist_ok=True)
+        g.to_parquet(os.path.join(target, "ranked.parquet"), index=False)
+        written.append((group, len(g), g["offer"].iloc[0]))
+    return written
+
+
+def run_pool(fn, jobs, workers):
+    if workers == 1:
+        return [fn(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Batch-score value-equation offer files under several weight profiles.")
+    ap.add_argument("--input", nargs="+", required=True, help="CSV/Parquet files or folders searched recursively")
+    ap.add_argument("--profiles", help="CSV with name, w_outcome, w_likelihood, w_time, w_effort columns")
+    ap.add_argument("--weights", action="append", metavar="NAME=W1,W2,W3,W4",
+                    help="extra weight profile (outcome, likelihood, time, effort); repeatable")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (1 = run inline)")
+    ap.add_argument("--out", default="output/value_equation", help="output folder, one group=<name> subfolder per group")
+    args = ap.parse_args()
+
+    names, W = read_profiles(args.profiles, args.weights)
+    bad = [n for n in names if not n.replace("_", "").replace("-", "").isalnum()]
+    if bad:
+        sys.exit(f"Profile names become column names; use letters, digits, - or _: {', '.join(bad)}")
+    files = find_files(args.input)
+    if not files:
+        sys.exit("No CSV or Parquet offer files found.")
+
+    workers = max(1, args.workers or 1)
+    os.makedirs(args.out, exist_ok=True)
+    spill = tempfile.mkdtemp(prefix="value_eq_", dir=args.out)
+    try:
+        jobs = [(path, rg, names, W, spill, i) for i, (path, rg) in enumerate(split_jobs(files, workers))]
+        scored = run_pool(score_file, jobs, min(workers, len(jobs)))
+        # A Parquet file split into row-group slices either counts whole or not at all
+        failed = {path for path, _, err in scored if err is not None}
+        for (path, _, _, _, _, tag), (_, rows, _) in zip(jobs, scored):
+            if path in failed and rows:
+                for p in range(PARTITIONS):
+                    for name in glob.glob(os.path.join(spill, f"p={p}", f"{tag}-*.parquet")):
+                        os.remove(name)
+        scored = [(path, 0 if path in failed else rows, err) for path, rows, err in scored]
+        # Rank into a fresh folder, then swap it in so no group folder from an earlier run survives
+        ranked = os.path.join(spill, "_ranked")
+        parts = [(os.path.join(spill, f"p={p}"), names, ranked) for p in range(PARTITIONS)]
+        written = [w for ws in run_pool(rank_partition, parts, min(workers, PARTITIONS)) for w in ws]
+        for old in glob.glob(os.path.join(glob.escape(args.out), "group=*")):
+            shutil.rmtree(old)
+        for name in os.listdir(ranked) if os.path.isdir(ranked) else []:
+            os.replace(os.path.join(ranked, name), os.path.join(args.out, name))
+    finally:
+        shutil.rmtree(spill, ignore_errors=True)
+
+    errors = [(path, err) for path, _, err in scored if err is not None]
+    err_path = os.path.join(args.out, "_errors.csv")
+    if os.path.exists(err_path):
+        os.remove(err_path)
+    if errors:
+        pd.DataFrame(errors, columns=["file", "error"]).to_csv(err_path, index=False)
+        print(f"{len(errors)} file(s) failed; see {err_path}", file=sys.stderr)
+    summary = pd.DataFrame(written, columns=["group", "offers", f"top_offer_{names[0]}"]).sort_values("group")
+    summary.to_csv(os.path.join(args.out, "_summary.csv"), index=False)
+
+    rows = sum(r for _, r, _ in scored)
+    print(f"Done. {rows:,} offers from {len(files)} file(s) scored under {len(names)} profile(s) "
+          f"into {len(summary)} group folder(s) in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+# Value Equation engine – input cleaning and log-space scoring, importable without Streamlit
+
+from __future__ import annotations
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLS = ["offer", "dream_outcome", "likelihood", "time_delay", "effort_sacrifice"]
+FACTOR_COLS = ["dream_outcome", "likelihood", "time_delay", "effort_sacrifice"]
+# Sample variance and respondent count per factor, present when inputs come from survey responses
+STAT_COLS = [f"{c}_var" for c in FACTOR_COLS] + [f"{c}_n" for c in FACTOR_COLS]
+OPTIONAL_COLS = ["group"] + STAT_COLS
+# Outcome and likelihood multiply the score, time and effort divide it
+FACTOR_SIGNS = np.array([1.0, 1.0, -1.0, -1.0])
+TIE_DECIMALS = 9
+SWEEP_BYTES = 256 * 1024 ** 2
+# Upper edges of the rank buckets reported by weight_sweep; the last bucket is open-ended
+RANK_BUCKETS = (1, 3, 10, 25, 100)
+# Pairwise comparisons per array op in pareto_frontier (bounds the temporary boolean arrays)
+FILTER_CELLS = 4 * 1024 ** 2
+
+
+# ---------- Cleaning ----------
+COLUMN_ALIASES = {
+    "offer": "offer",
+    "name": "offer",
+    "dream outcome": "dream_outcome",
+    "dream_outcome": "dream_outcome",
+    "outcome": "dream_outcome",
+    "likelihood": "likelihood",
+    "pol": "likelihood",
+    "probability": "likelihood",
+    "time delay": "time_delay",
+    "time_delay": "time_delay",
+    "time": "time_delay",
+    "effort & sacrifice": "effort_sacrifice",
+    "effort_&_sacrifice": "effort_sacrifice",
+    "effort_sacrifice": "effort_sacrifice",
+    "effort": "effort_sacrifice",
+    "group": "group",
+    "segment": "group",
+    "competitor": "group",
+}
+
+
+def canonical_name(name: str) -> str:
+    """Canonical column / factor name for a header or survey label, e.g. "Dream Outcome" -> dream_outcome."""
+    key = str(name).strip().lower().replace("-", "_").replace(" ", "_")
+    return COLUMN_ALIASES.get(key, key)
+
+
+def canonicalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.columns = [canonical_name(c) for c in df.columns]
+    return df
+
+
+def coerce_numeric(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    df = df.copy()
+    for c in cols:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df
+
+
+def validate_required_columns(df: pd.DataFrame) -> list[str]:
+    return [c for c in REQUIRED_COLS if c not in df.columns]
+
+
+def clean_and_prepare(df: pd.DataFrame) -> pd.DataFrame:
+    df = canonicalize_columns(df)
+    miss = validate_required_columns(df)
+    if miss:
+        raise ValueError("Missing required columns: " + ", ".join(miss))
+
+    keep = [c for c in REQUIRED_COLS + OPTIONAL_COLS if c in df.columns]
+    df = df[keep].copy()
+
+    df = coerce_numeric(df, [c for c in REQUIRED_COLS + STAT_COLS if c != "offer" and c in df.columns])
+
+    for c in FACTOR_COLS:
+        df[c] = df[c].clip(lower=0.1, upper=10)
+
+    if "group" not in df.columns:
+        df["group"] = "Company"
+
+    df["offer"] = df["offer"].astype(str).str.strip()
+    return df
+
+
+# ---------- Log-space scoring ----------
+def log_matrix(df: pd.DataFrame) -> np.ndarray:
+    """Signed log factors as a (4, n) factor-major array: log score = weights @ matrix.
+
+    The score is multiplicative, so it is linear in log space; build this once per
+    dataset and every weight vector costs one matrix-vector product.
+    """
+    vals = df[FACTOR_COLS].to_numpy(dtype=float).T
+    vals = np.where(np.isinf(vals), np.nan, vals)
+    return np.ascontiguousarray(np.log(np.clip(vals, 1e-9, None)) * FACTOR_SIGNS[:, None])
+
+
+def weight_vector(w_outcome=1.0, w_likelihood=1.0, w_time=1.0, w_effort=1.0) -> np.ndarray:
+    return np.array([w_outcome, w_likelihood, w_time, w_effort], dtype=float)
+
+
+def log_scores(L: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """log(value_score) per offer; NaN factors give NaN."""
+    return np.asarray(weights, dtype=float) @ L
+
+
+def compute_value_score(
+    df: pd.DataFrame,
+    w_outcome: float = 1.0,
+    w_likelihood: float = 1.0,
+    w_time: float = 1.0,
+    w_effort: float = 1.0,
+) -> pd.DataFrame:
+    w = weight_vector(w_outcome, w_likelihood, w_time, w_effort)
+    return df.assign(value_score=np.exp(log_scores(log_matrix(df), w)))
+
+
+def dense_rank(scores: np.ndarray) -> np.ndarray:
+    """Dense rank of log scores, 1 = highest; NaN ranks last.
+
+    Scores are rounded to TIE_DECIMALS first so mathematically equal scores (e.g. 8·5/4·10
+    and 10·4/5·8) tie instead of being split by floating-point noise.
+    """
+    filled = np.where(np.isnan(scores), -np.inf, np.round(scores, TIE_DECIMALS))
+    _, inverse = np.unique(-filled, return_inverse=True)
+    return inverse + 1
+
+
+def top_rows(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Positions of the k highest scores, best first, with their dense ranks.
+
+    Uses partial selection, so cost is O(n) rather than a full sort. Ranks are exact:
+    every distinct score above a selected row is itself selected.
+    """
+    filled = np.where(np.isnan(scores), -np.inf, scores)
+    n = len(filled)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    idx = np.argpartition(filled, n - k)[n - k:] if k < n else np.arange(n)
+    idx = idx[np.argsort(-filled[idx], kind="stable")]
+    return idx, dense_rank(filled[idx])
+
+
+# ---------- Confidence intervals ----------
+def has_survey_stats(df: pd.DataFrame) -> bool:
+    return all(c in df.columns for c in STAT_COLS)
+
+
+def score_intervals(
+    df: pd.DataFrame,
+    weights: np.ndarray,
+    level: float = 0.95,
+    method: str = "delta",
+    draws: int = 2000,
+    seed: int | None = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Confidence interval for value_score from the survey variance and count of each factor mean.
+
+    "delta": log score is linear in the log factor means, so its standard error is
+    sqrt(Σ w² · var / (n · mean²)) and the interval is exp(log score ± z · se).
+    "bootstrap": parametric – factor means are redrawn from their normal sampling
+    distribution (clipped to the 0.1–10 scale like the inputs) and the score percentiles
+    are taken, in offer chunks of at most SWEEP_BYTES. Factors are treated as independent.
+    Offers with fewer than two responses on any factor get NaN bounds.
+    """
+    w = np.asarray(weights, dtype=float)
+    means = df[FACTOR_COLS].to_numpy(dtype=float)
+    n = df[[f"{c}_n" for c in FACTOR_COLS]].to_numpy(dtype=float)
+    var = df[[f"{c}_var" for c in FACTOR_COLS]].to_numpy(dtype=float)
+    sem2 = np.where(n >= 2, var / np.maximum(n, 1), np.nan)
+    alpha = (1 - level) / 2
+    log_score = log_scores(log_matrix(df), w)
+
+    if method == "delta":
+        se = np.sqrt((w ** 2 * sem2 / np.clip(means, 1e-9, None) ** 2).sum(axis=1))
+        z = NormalDist().inv_cdf(1 - alpha)
+        return np.exp(log_score - z * se), np.exp(log_score + z * se)
+
+    rng = np.random.default_rng(seed)
+    low = np.full(len(df), np.nan)
+    high = np.full(len(df), np.nan)
+    block = max(1, SWEEP_BYTES // (8 * draws * len(FACTOR_COLS) * 2))
+    for start in range(0, len(df), block):
+        mu, sd = means[start:start + block], np.sqrt(sem2[start:start + block])
+        sample = np.clip(mu + sd * rng.standard_normal((draws,) + mu.shape), 0.1, 10)
+        logs = (np.log(sample) * (FACTOR_SIGNS * w)).sum(axis=2)
+        lo, hi = np.quantile(logs, [alpha, 1 - alpha], axis=0)
+        low[start:start + block], high[start:start + block] = np.exp(lo), np.exp(hi)
+    return low, high
+
+
+# ---------- Weight sweep ----------
+def weight_grid(low: float, high: float, steps: int) -> np.ndarray:
+    """Every combination of `steps` evenly spaced values per factor, as an (steps**4, 4) array."""
+    axis = np.linspace(low, high, steps)
+    return np.stack(np.meshgrid(axis, axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 4)
+
+
+def random_weights(count: int, low: float, high: float, seed: int | None = None) -> np.ndarray:
+    return np.random.default_rng(seed).uniform(low, high, size=(count, 4))
+
+
+def _row_ranks(S: np.ndarray) -> np.ndarray:
+    """Competition rank per row of an (m, n) log-score block, 1 = highest; ties share the best rank."""
+    m, n = S.shape
+    filled = np.where(np.isnan(S), -np.inf, np.round(S, TIE_DECIMALS))
+    order = np.argsort(-filled, axis=1)
+    ordered = np.take_along_axis(filled, order, axis=1)
+    pos = np.broadcast_to(np.arange(n), (m, n))
+    new_value = np.ones((m, n), dtype=bool)
+    new_value[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    first = np.maximum.accumulate(np.where(new_value, pos, 0), axis=1)
+    ranks = np.empty((m, n), dtype=np.int32)
+    np.put_along_axis(ranks, order, (first + 1).astype(np.int32), axis=1)
+    return ranks
+
+
+def weight_sweep(L: np.ndarray, W: np.ndarray) -> pd.DataFrame:
+    """Rank every offer under every weight vector in W (m × 4) and summarise per offer.
+
+    Scores for a block of weight vectors are one (k, 4) @ (4, n) product; blocks are sized
+    so the score and rank arrays stay within SWEEP_BYTES. Returns one row per offer (in
+    L's column order) with p_first, mean/best/worst rank and the share of vectors landing
+    in each RANK_BUCKETS bucket.
+    """
+    W = np.atleast_2d(np.asarray(W, dtype=float))
+    m, n = len(W), L.shape[1]
+    edges = [e for e in RANK_BUCKETS if e < n]
+    rank_sum = np.zeros(n)
+    best = np.full(n, np.iinfo(np.int32).max, dtype=np.int64)
+    worst = np.zeros(n, dtype=np.int64)
+    at_most = np.zeros((len(edges), n), dtype=np.int64)
+    block = max(1, SWEEP_BYTES // (40 * max(n, 1)))
+    for start in range(0, m, block):
+        ranks = _row_ranks(W[start:start + block] @ L)
+        rank_sum += ranks.sum(axis=0)
+        np.minimum(best, ranks.min(axis=0), out=best)
+        np.maximum(worst, ranks.max(axis=0), out=worst)
+        for i, e in enumerate(edges):
+            at_most[i] += (ranks <= e).sum(axis=0)
+
+    out = pd.DataFrame(
+        {
+            "p_first": at_most[0] / m if edges else np.ones(n),
+            "mean_rank": rank_sum / m,
+            "best_rank": best,
+            "worst_rank": worst,
+        }
+    )
+    lower = 1
+    cum_prev = np.zeros(n, dtype=np.int64)
+    for e, cum in zip(edges, at_most):
+        out[f"rank {lower}" if e == lower else f"rank {lower}–{e}"] = (cum - cum_prev) / m
+        cum_prev, lower = cum, e + 1
+    out[f"rank {lower}+"] = (m - cum_prev) / m
+    return out
+
+
+# ---------- Top-k and dominance ----------
+def group_buckets(groups) -> tuple[np.ndarray, np.ndarray]:
+    """(order, bounds): row positions sorted by group and the start/end of each group's run in `order`."""
+    codes, _ = pd.factorize(pd.Series(groups), use_na_sentinel=False)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.r_[0, np.flatnonzero(np.diff(codes[order])) + 1, len(order)]
+    return order, bounds
+
+
+def top_k_by_group(scores: np.ndarray, groups, k: int, buckets: tuple | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Positions of the k highest scores within each group, with their dense rank inside the group.
+
+    One integer sort buckets the rows by group (pass `buckets` from group_buckets to reuse it across
+    weight changes); each bucket then uses top_rows' partial selection, so no group's scores are
+    fully sorted.
+    """
+    order, bounds = buckets if buckets is not None else group_buckets(groups)
+    idx, ranks = [], []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        members = order[a:b]
+        top, rank = top_rows(scores[members], k)
+        idx.append(members[top])
+        ranks.append(rank)
+    if not idx:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return np.concatenate(idx), np.concatenate(ranks)
+
+
+def pareto_frontier(df: pd.DataFrame, block: int = 1024) -> tuple[np.ndarray, np.ndarray]:
+    """Offers no other offer beats on all four raw factors, and a frontier dominator for the rest.
+
+    An offer is dominated when another has outcome and likelihood at least as high and time and
+    effort at least as low, strictly better on one. Returns (on_frontier, dominated_by), where
+    dominated_by is the position of a frontier offer dominating each row (-1 on the frontier or
+    when a factor is missing). Sort-filter skyline: identical factor vectors are collapsed, the
+    distinct points are sorted by their summed (signed) factors so a dominator always comes first.
+    Points are then taken a block at a time: the block is checked against itself, and its new
+    frontier points filter every remaining point in one array compare.
+    """
+    vals = df[FACTOR_COLS].to_numpy(dtype=float) * FACTOR_SIGNS
+    n = len(vals)
+    on_frontier = np.zeros(n, dtype=bool)
+    dominated_by = np.full(n, -1, dtype=np.int64)
+    valid = np.flatnonzero(np.isfinite(vals).all(axis=1))
+    if not len(valid):
+        return on_frontier, dominated_by
+
+    # Hash-based dedupe; np.unique(axis=0) sorts rows lexicographically and is far slower
+    inverse = pd.DataFrame(vals[valid]).groupby(list(range(len(FACTOR_COLS))), sort=False).ngroup().to_numpy()
+    first = np.empty(inverse.max() + 1, dtype=np.int64)
+    first[inverse[::-1]] = np.arange(len(inverse))[::-1]
+    points = vals[valid][first]
+    order = np.argsort(-points.sum(axis=1), kind="stable")
+    points = points[order]
+    u = len(points)
+    dom = np.full(u, -1, dtype=np.int64)          # index of a dominating point, in sorted order
+
+    def dominance(A, B):
+        # d[i, j]: A[i] >= B[j] on every factor; points are distinct, so off the diagonal this is dominance
+        d = A[:, None, 0] >= B[None, :, 0]
+        for f in range(1, A.shape[1]):
+            d &= A[:, None, f] >= B[None, :, f]
+        return d
+
+    # Invariant: every point in `remaining` has been checked against the whole frontier found so far
+    remaining = np.arange(u)
+    while len(remaining):
+        blk, rest = remaining[:block], remaining[block:]
+        # Within a block only earlier points can dominate later ones after the sort
+        d = dominance(points[blk], points[blk])
+        np.fill_diagonal(d, False)
+        inner = d.any(axis=0)
+        dom[blk[inner]] = blk[d.argmax(axis=0)[inner]]
+        new = blk[~inner]
+        # Filter everything left against the new frontier points; most rows drop out in the first rounds
+        alive = np.ones(len(rest), dtype=bool)
+        step = max(1, FILTER_CELLS // max(len(new), 1))
+        for start in range(0, len(rest), step):
+            chunk = rest[start:start + step]
+            d = dominance(points[new], points[chunk])
+            found = d.any(axis=0)
+            dom[chunk[found]] = new[d.argmax(axis=0)[found]]
+            alive[start:start + step] = ~found
+        remaining = rest[alive]
+
+    # A dominator may itself be dominated; follow the chain to a frontier point (dominance is transitive)
+    while True:
+        parent = np.where(dom >= 0, dom[np.maximum(dom, 0)], -1)
+        step = (dom >= 0) & (parent >= 0)
+        if not step.any():
+            break
+        dom = np.where(step, parent, dom)
+
+    # Back to row positions: a distinct point's representative row is its first occurrence
+    rep = valid[first[order]]
+    sorted_pos = np.empty(u, dtype=np.int64)
+    sorted_pos[order] = np.arange(u)
+    point_dom = dom[sorted_pos[inverse]]
+    on_frontier[valid] = point_dom < 0
+    dominated_by[valid] = np.where(point_dom >= 0, rep[np.maximum(point_dom, 0)], -1)
+    return on_frontier, dominated_by
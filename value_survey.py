@@ -0,0 +1,98 @@
+# Survey ingestion – per-offer factor means, variances and counts from respondent × offer × factor rows
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from purchase_flows import Vocabulary, iter_batches
+from value_equation_engine import FACTOR_COLS, canonical_name
+
+
+def _factor_codes(col: pa.Array) -> np.ndarray:
+    # Index into FACTOR_COLS per row; labels such as "Dream Outcome" or "effort" are canonicalised, unknown → -1
+    enc = pc.dictionary_encode(col.cast(pa.string()))
+    lookup = np.array(
+        [FACTOR_COLS.index(f) if (f := canonical_name(label)) in FACTOR_COLS else -1
+         for label in enc.dictionary.to_pylist()] + [-1],
+        dtype=np.int64,
+    )
+    return lookup[pc.fill_null(enc.indices, len(lookup) - 1).to_numpy(zero_copy_only=False)]
+
+
+def _scores(col: pa.Array) -> np.ndarray:
+    if pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+        return pc.cast(col, pa.float64()).to_numpy(zero_copy_only=False)
+    return pd.to_numeric(pd.Series(col.to_numpy(zero_copy_only=False)), errors="coerce").to_numpy(dtype=float)
+
+
+def aggregate_survey(
+    path: str,
+    offer_col: str = "offer",
+    factor_col: str = "factor",
+    score_col: str = "score",
+    group_col: str | None = None,
+) -> dict:
+    """Per-offer factor statistics from a long survey file (CSV or Parquet) with bounded memory.
+
+    Rows are read in batches; each batch is reduced to per (offer, factor) count, mean and sum of
+    squared deviations with bincount, then merged into the running totals with Chan's parallel
+    update, so precision does not degrade with millions of responses. Returns
+    {"stats", "rows", "dropped"}: `stats` has offer, group and the four factor means (ready for
+    clean_and_prepare) plus `<factor>_var` (sample variance) and `<factor>_n` per factor.
+    """
+    F = len(FACTOR_COLS)
+    offers, groups = Vocabulary(), Vocabulary()
+    count = np.zeros(0)
+    mean = np.zeros(0)
+    m2 = np.zeros(0)
+    group_of = np.zeros(0, dtype=np.int64)
+    rows = dropped = 0
+    columns = [offer_col, factor_col, score_col] + ([group_col] if group_col else [])
+    for batch in iter_batches(path, columns):
+        offer = offers.encode(batch.column(offer_col), None).astype(np.int64)
+        factor = _factor_codes(batch.column(factor_col))
+        x = _scores(batch.column(score_col))
+        ok = (offer >= 0) & (factor >= 0) & np.isfinite(x)
+        rows += len(ok)
+        dropped += int((~ok).sum())
+
+        size = len(offers.labels) * F
+        if size > len(count):
+            grow = size - len(count)
+            count, mean, m2 = np.r_[count, np.zeros(grow)], np.r_[mean, np.zeros(grow)], np.r_[m2, np.zeros(grow)]
+            group_of = np.r_[group_of, np.full(len(offers.labels) - len(group_of), -1)]
+        if group_col:
+            g = groups.encode(batch.column(group_col), None).astype(np.int64)
+            first = ok & (g >= 0) & (group_of[offer] < 0)
+            group_of[offer[first]] = g[first]
+
+        key, x = offer[ok] * F + factor[ok], x[ok]
+        n_b = np.bincount(key, minlength=size).astype(float)
+        seen = n_b > 0
+        mean_b = np.zeros(size)
+        mean_b[seen] = np.bincount(key, weights=x, minlength=size)[seen] / n_b[seen]
+        m2_b = np.bincount(key, weights=(x - mean_b[key]) ** 2, minlength=size)
+
+        total = count + n_b
+        delta = mean_b - mean
+        safe = np.where(total > 0, total, 1.0)
+        mean = np.where(seen, mean + delta * n_b / safe, mean)
+        m2 = np.where(seen, m2 + m2_b + delta ** 2 * count * n_b / safe, m2)
+        count = total
+
+    V = len(offers.labels)
+    n = count[:V * F].reshape(V, F)
+    mu = np.where(n > 0, mean[:V * F].reshape(V, F), np.nan)
+    var = np.where(n > 1, m2[:V * F].reshape(V, F) / np.maximum(n - 1, 1), np.nan)
+    group_names = np.array(groups.labels + ["Company"], dtype=object)
+    stats = pd.DataFrame({"offer": offers.labels, "group": group_names[group_of[:V]]})
+    for j, c in enumerate(FACTOR_COLS):
+        stats[c] = mu[:, j]
+    for j, c in enumerate(FACTOR_COLS):
+        stats[f"{c}_var"] = var[:, j]
+    for j, c in enumerate(FACTOR_COLS):
+        stats[f"{c}_n"] = n[:, j].astype(np.int64)
+    return {"stats": stats, "rows": rows, "dropped": dropped}